@@ -3,14 +3,19 @@ Cryptographic utilities for secure communication.
 Handles key generation, encryption, decryption, and digital signatures.
 """
 
+import hashlib
+import itertools
+import os
+import sys
+from typing import Optional
+
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import os
-import sys
 from cryptography.hazmat.primitives import serialization
-from typing import Optional
+
+NONCE_COUNTER_LIMIT = 2 ** 64  # Messages per session key before renewal is mandatory
 
 
 class CryptoManager:
@@ -37,23 +42,29 @@ class CryptoManager:
             
         self.private_key = self._load_or_generate_private_key()
         self.public_key = self.private_key.public_key()
+        self._cache_public_key()
         self.peer_public_key: Optional[ec.EllipticCurvePublicKey] = None
+        self._peer_fingerprint: Optional[str] = None
         self.session_key: Optional[bytes] = None
-        self.cipher: Optional[AESGCM] = None
+        self._send_cipher: Optional[AESGCM] = None
+        self._recv_cipher: Optional[AESGCM] = None
+        self._nonce_counter = itertools.count()
 
     def _load_or_generate_private_key(self) -> ec.EllipticCurvePrivateKey:
-        if os.path.exists(self.keyfile):
-            passphrase = input("Passphrase (keep empty if none) : ")
+        # Open directly instead of checking existence first (one syscall, no race)
+        try:
+            with open(self.keyfile, "rb") as f:
+                key_data = f.read()
+        except FileNotFoundError:
+            os.makedirs(self.keys_dir, exist_ok=True)
+            passphrase = input("New passphrase (keep empty if none) : ")
             password = passphrase.encode() if passphrase else None
-            return self._load_private_key_from_file(self.keyfile, password)
-        os.makedirs(self.keys_dir, exist_ok=True)
-        passphrase = input("New passphrase (keep empty if none) : ")
+            return self._generate_private_key_file(self.keyfile, password)
+        passphrase = input("Passphrase (keep empty if none) : ")
         password = passphrase.encode() if passphrase else None
-        return self._generate_private_key_file(self.keyfile, password)
+        return self._load_private_key(key_data, password)
 
-    def _load_private_key_from_file(self, path: str, password: bytes | None) -> ec.EllipticCurvePrivateKey:
-        with open(path, "rb") as f:
-            key_data = f.read()
+    def _load_private_key(self, key_data: bytes, password: bytes | None) -> ec.EllipticCurvePrivateKey:
         try:
             return serialization.load_pem_private_key(key_data, password=password)
         except Exception:
@@ -84,9 +95,10 @@ class CryptoManager:
         password = passphrase.encode() if passphrase else None
         self.private_key = self._generate_private_key_file(self.keyfile, password)
         self.public_key = self.private_key.public_key()
+        self._cache_public_key()
         self.peer_public_key = None
-        self.session_key = None
-        self.cipher = None
+        self._peer_fingerprint = None
+        self._clear_session()
 
     def sign_challenge(self, challenge: bytes) -> bytes:
         """Sign a challenge with the user's private key."""
@@ -101,68 +113,114 @@ class CryptoManager:
         except Exception:
             return False
 
-    def get_public_bytes(self) -> bytes:
-        """Return the public key as bytes."""
-        return self.public_key.public_bytes(
+    @staticmethod
+    def _serialize_public_key(public_key: ec.EllipticCurvePublicKey) -> bytes:
+        """Serialize a public key as a compressed X9.62 point."""
+        return public_key.public_bytes(
             encoding=serialization.Encoding.X962,
             format=serialization.PublicFormat.CompressedPoint
         )
 
+    @staticmethod
+    def _fingerprint(public_bytes: bytes) -> str:
+        """Calculate the SHA256 fingerprint of serialized public key bytes."""
+        return hashlib.sha256(public_bytes).hexdigest()
+
+    def _cache_public_key(self) -> None:
+        """Cache the serialized public key and its fingerprint (immutable until reset_keys)."""
+        self._public_bytes = self._serialize_public_key(self.public_key)
+        self._public_fingerprint = self._fingerprint(self._public_bytes)
+
+    def get_public_bytes(self) -> bytes:
+        """Return the public key as bytes."""
+        return self._public_bytes
+
     def set_peer_public_key(self, peer_key_bytes: bytes) -> None:
-        """Configure the public key of the remote peer."""
+        """Configure the public key of the remote peer (the session is set up by establish_session)."""
         self.peer_public_key = ec.EllipticCurvePublicKey.from_encoded_point(
             ec.SECP384R1(),
             peer_key_bytes
         )
-        self._derive_session_key()
+        self._peer_fingerprint = self._fingerprint(self._serialize_public_key(self.peer_public_key))
+        self._clear_session()
+
+    def establish_session(self, my_challenge: bytes, peer_challenge: bytes, initiator: bool) -> None:
+        """
+        Derive fresh session keys for this connection.
+        Args:
+            my_challenge: Random challenge this side sent during the handshake.
+            peer_challenge: Random challenge received from the peer.
+            initiator: Whether this side opened the connection.
+        """
+        if initiator:
+            self._derive_session_key(my_challenge + peer_challenge, initiator)
+        else:
+            self._derive_session_key(peer_challenge + my_challenge, initiator)
 
     def get_public_key_fingerprint(self) -> str:
-        """Calculate the SHA256 fingerprint of the public key."""
-        digest = hashes.Hash(hashes.SHA256())
-        digest.update(self.get_public_bytes())
-        return digest.finalize().hex()
+        """Return the SHA256 fingerprint of the public key."""
+        return self._public_fingerprint
 
     def get_peer_fingerprint(self) -> str:
         """Return the peer's public key fingerprint."""
         if not self.peer_public_key:
             raise ValueError("Peer's public key not defined")
-        digest = hashes.Hash(hashes.SHA256())
-        digest.update(
-            self.peer_public_key.public_bytes(
-                encoding=serialization.Encoding.X962,
-                format=serialization.PublicFormat.CompressedPoint
-            )
-        )
-        return digest.finalize().hex()
+        return self._peer_fingerprint
 
-    def _derive_session_key(self) -> None:
-        """Derive the session key after the key exchange."""
+    def _derive_session_key(self, session_salt: bytes, initiator: bool) -> None:
+        """
+        Derive the session keys after the key exchange.
+        The static ECDH secret is salted with both handshake challenges, so every session gets new keys,
+        and each direction has its own key, so the two peers' nonce counters never share a key.
+        """
         if not self.peer_public_key:
             raise ValueError("Peer's public key is not defined")
         
         # Perform the Diffie-Hellman key exchange
         shared_key = self.private_key.exchange(ec.ECDH(), self.peer_public_key)
         
-        # Derive session key with HKDF
+        # Derive the initiator->responder and responder->initiator keys with HKDF
         hkdf = HKDF(
             algorithm=hashes.SHA256(),
-            length=32,
-            salt=None,
-            info=b"Cigarettes-session-key"
+            length=64,
+            salt=session_salt,
+            info=b"Cigarettes-session-keys"
         )
         self.session_key = hkdf.derive(shared_key)
-        self.cipher = AESGCM(self.session_key)
+        initiator_key, responder_key = self.session_key[:32], self.session_key[32:]
+        self._send_cipher = AESGCM(initiator_key if initiator else responder_key)
+        self._recv_cipher = AESGCM(responder_key if initiator else initiator_key)
+        self._nonce_counter = itertools.count()
+
+    def _clear_session(self) -> None:
+        """Forget the session keys."""
+        self.session_key = None
+        self._send_cipher = None
+        self._recv_cipher = None
+        self._nonce_counter = itertools.count()
+
+    def _next_nonce(self) -> bytes:
+        """
+        Return the next 96-bit nonce for the current session: a message counter,
+        unique because the sending key is specific to this session and direction.
+        The session key must be renewed before 2**64 messages are encrypted.
+        Safe to call from several threads: next() on itertools.count is atomic.
+        """
+        counter = next(self._nonce_counter)
+        if counter >= NONCE_COUNTER_LIMIT:
+            raise ValueError("Nonce space exhausted, the session key must be renewed")
+        return counter.to_bytes(12, "big")
 
     def encrypt_message(self, message: str) -> bytes:
         """Encrypt a message with the session key."""
         if not self.session_key:
             raise ValueError("The session key is not yet established")
         
-        # Random nonce generation
-        nonce = os.urandom(12)
+        # Unique nonce generation (message counter)
+        nonce = self._next_nonce()
         
         # Message encryption
-        ciphertext = self.cipher.encrypt(nonce, message.encode(), None)
+        ciphertext = self._send_cipher.encrypt(nonce, message.encode(), None)
         
         # Concatenation of nonce and ciphertext for transmission
         return nonce + ciphertext
@@ -177,15 +235,15 @@ class CryptoManager:
         ciphertext = encrypted_data[12:]
         
         # Decrypting the message
-        plaintext = self.cipher.decrypt(nonce, ciphertext, None)
+        plaintext = self._recv_cipher.decrypt(nonce, ciphertext, None)
         return plaintext.decode()
 
     def encrypt_bytes(self, data: bytes) -> bytes:
         """Encrypt binary data with the session key (for file transfer)."""
         if not self.session_key:
             raise ValueError("The session key is not yet established")
-        nonce = os.urandom(12)
-        ciphertext = self.cipher.encrypt(nonce, data, None)
+        nonce = self._next_nonce()
+        ciphertext = self._send_cipher.encrypt(nonce, data, None)
         return nonce + ciphertext
 
     def decrypt_bytes(self, encrypted_data: bytes) -> bytes:
@@ -194,4 +252,21 @@ class CryptoManager:
             raise ValueError("The session key is not yet established")
         nonce = encrypted_data[:12]
         ciphertext = encrypted_data[12:]
-        return self.cipher.decrypt(nonce, ciphertext, None) 
\ No newline at end of file
+        return self._recv_cipher.decrypt(nonce, ciphertext, None)
+
+    def decrypt_bytes_into(self, encrypted_data: bytes, buf: bytearray) -> memoryview:
+        """
+        Decrypt binary data into a caller-owned buffer (for file transfer), avoiding a new plaintext object per chunk.
+        Returns a view of the plaintext, valid until the buffer is reused.
+        """
+        if not self.session_key:
+            raise ValueError("The session key is not yet established")
+        encrypted_data = memoryview(encrypted_data)
+        plain_len = len(encrypted_data) - 12 - 16
+        if plain_len < 0:
+            raise ValueError("Encrypted data is too short")
+        if plain_len > len(buf) or not hasattr(self._recv_cipher, 'decrypt_into'):  # decrypt_into needs cryptography >= 44
+            return memoryview(self._recv_cipher.decrypt(encrypted_data[:12], encrypted_data[12:], None))
+        out = memoryview(buf)[:plain_len]
+        self._recv_cipher.decrypt_into(encrypted_data[:12], encrypted_data[12:], None, out)
+        return out
@@ -1,6 +1,8 @@
 import os
 from typing import Optional
 
+FILE_TRANSFER_TOKEN = "__FILE_TRANSFER__"
+
 # Global states (adapt as needed for your project architecture)
 FILE_TRANSFER_PROCEDURE = False  # Sender: file transfer in progress
 FILE_TRANSFER_BOOL = False       # Receiver: waiting for file transfer acceptance
@@ -9,10 +11,7 @@ FILE_TRANSFER_BOOL = False       # Receiver: waiting for file transfer acceptanc
 file_transfer_context = {
     'file_path': None,
     'file_name': None,
-    'file_size': None,
-    'file_data': None,  # Encrypted
-    'chunks': None,
-    'current_chunk': 0
+    'file_size': None
 }
 
 # Temporary memory for file reception (receiver)
@@ -27,53 +26,47 @@ file_receive_context = {
 
 def initiate_file_transfer(file_path: str) -> Optional[str]:
     """
-    Prepares the transfer on the sender side: loads, encrypts, and prepares the file.
+    Prepares the transfer on the sender side. The file is not loaded in memory,
+    FileTransferMixin.send_file_data streams it once the peer accepts.
     Returns the announcement message to send.
     """
-    global FILE_TRANSFER_PROCEDURE, file_transfer_context
+    global FILE_TRANSFER_PROCEDURE
     if not os.path.isfile(file_path):
         return None
     file_name = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
-    with open(file_path, 'rb') as f:
-        file_data = f.read()
-    # TODO: Encrypt file_data here if needed
     file_transfer_context.update({
         'file_path': file_path,
         'file_name': file_name,
-        'file_size': file_size,
-        'file_data': file_data,
-        'chunks': [file_data[i:i+4096] for i in range(0, len(file_data), 4096)],
-        'current_chunk': 0
+        'file_size': file_size
     })
     FILE_TRANSFER_PROCEDURE = True
-    return f"__FILE_TRANSFER__ {file_name} {file_size}"
+    return f"{FILE_TRANSFER_TOKEN} {file_name} {file_size}"
 
 def handle_file_transfer_request(message: str):
     """
     Detects and processes a file transfer request message on the receiver side.
     """
-    global FILE_TRANSFER_BOOL, file_receive_context
-    # Search for the __FILE_TRANSFER__ token anywhere in the message
-    if "__FILE_TRANSFER__" in message:
-        # Get the part after the token
-        idx = message.index("__FILE_TRANSFER__")
-        file_info = message[idx + len("__FILE_TRANSFER__"):].strip().split()
-        if len(file_info) >= 2:
-            file_name = file_info[0]
-            try:
-                file_size = int(file_info[1])
-            except ValueError:
-                return None
-            file_receive_context.update({
-                'file_name': file_name,
-                'file_size': file_size,
-                'received_size': 0,
-                'file_obj': None
-            })
-            FILE_TRANSFER_BOOL = True
-            return f"[INFO] transfer file {file_name} {file_size} bytes, accept ? (/file_accept or /file_decline)"
-    return None
+    global FILE_TRANSFER_BOOL
+    if not message.startswith(FILE_TRANSFER_TOKEN):
+        return None
+    # Only the header fields are needed: "<name> <size>"
+    file_name, _, rest = message[len(FILE_TRANSFER_TOKEN):].lstrip().partition(" ")
+    size_str = rest.partition(" ")[0]
+    if not file_name or not size_str:
+        return None
+    try:
+        file_size = int(size_str)
+    except ValueError:
+        return None
+    file_receive_context.update({
+        'file_name': file_name,
+        'file_size': file_size,
+        'received_size': 0,
+        'file_obj': None
+    })
+    FILE_TRANSFER_BOOL = True
+    return f"[INFO] transfer file {file_name} {file_size} bytes, accept ? (/file_accept or /file_decline)"
 
 def accept_file_transfer():
     """
@@ -85,30 +78,15 @@ def decline_file_transfer():
     """
     Receiver side: declines the file transfer.
     """
-    global FILE_TRANSFER_BOOL, file_receive_context
+    global FILE_TRANSFER_BOOL
     FILE_TRANSFER_BOOL = False
-    file_receive_context = {k: None for k in file_receive_context}
+    _clear_receive_context()
     return "[INFO] File transfer declined."
 
-def handle_file_transfer_accepted():
-    """
-    Sender side: triggers the sending of the file in chunks.
-    """
-    global file_transfer_context, FILE_TRANSFER_PROCEDURE
-    chunks = file_transfer_context.get('chunks')
-    if not chunks:
-        return []
-    messages = []
-    for chunk in chunks:
-        messages.append(chunk)
-    reset_all_file_transfer_state()
-    return messages
-
 def receive_file_chunk(chunk: bytes):
     """
     Receiver side: receives a file chunk.
     """
-    global file_receive_context
     if file_receive_context['file_obj'] is None:
         os.makedirs('received_files', exist_ok=True)
         file_path = os.path.join('received_files', file_receive_context['file_name'])
@@ -126,16 +104,26 @@ def reset_file_receive_context():
     """
     Resets the file reception context and state.
     """
-    global FILE_TRANSFER_BOOL, file_receive_context
+    global FILE_TRANSFER_BOOL
     FILE_TRANSFER_BOOL = False
-    file_receive_context = {k: None for k in file_receive_context}
+    _clear_receive_context()
 
 def reset_all_file_transfer_state():
     """
     Resets all file transfer states and contexts (sender and receiver).
     """
-    global FILE_TRANSFER_PROCEDURE, FILE_TRANSFER_BOOL, file_transfer_context, file_receive_context
+    global FILE_TRANSFER_PROCEDURE, FILE_TRANSFER_BOOL
     FILE_TRANSFER_PROCEDURE = False
     FILE_TRANSFER_BOOL = False
-    file_transfer_context = {k: None for k in file_transfer_context}
-    file_receive_context = {k: None for k in file_receive_context} 
\ No newline at end of file
+    _clear_transfer_context()
+    _clear_receive_context()
+
+# --- Helpers ---
+# The contexts are cleared in place so that modules holding a reference
+# to them (e.g. via `from file_transfer import file_receive_context`) stay in sync.
+
+def _clear_transfer_context():
+    file_transfer_context.update(dict.fromkeys(file_transfer_context, None))
+
+def _clear_receive_context():
+    file_receive_context.update(dict.fromkeys(file_receive_context, None), received_size=0) 
\ No newline at end of file
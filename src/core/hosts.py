@@ -3,17 +3,63 @@ Known hosts management for storing and retrieving peer information.
 Handles host addresses, fingerprints, and nicknames.
 """
 
+import atexit
+import ipaddress
 import json
 import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
 from typing import Dict, Optional, List
 
+# orjson (see requirements.txt) parses and dumps much faster, the stdlib remains a fallback
+try:
+    import orjson
+
+    def _dumps(data: Dict) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(data: Dict) -> bytes:
+        return json.dumps(data, indent=2).encode()
+
+    _loads = json.loads
+
+# Onion address format, compiled once at import
+_ONION_RE = re.compile(r'^[a-z2-7]+\.onion(?::(\d{1,5}))?$', re.IGNORECASE)
 
 class KnownHostsManager:
     """
     Manages known hosts, their fingerprints, and nicknames.
     Provides methods for adding, removing, and querying host information.
     """
-    
+    SAVE_INTERVAL = 5.0  # Minimum delay in seconds between two writes of the hosts file
+
+    _instances: Dict[Optional[str], "KnownHostsManager"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, hosts_file: str = None) -> "KnownHostsManager":
+        """
+        Get the shared manager for a hosts file, creating it on first use.
+        All components using the same file share its data and pending writes.
+        
+        Args:
+            hosts_file: Path to the JSON file storing host information (optional, uses default location)
+        """
+        key = os.path.abspath(hosts_file) if hosts_file else None
+        with cls._instances_lock:
+            if key not in cls._instances:
+                manager = cls(hosts_file)
+                # Pending changes of shared managers are written when the application exits
+                atexit.register(manager._flush_if_dirty)
+                cls._instances[key] = manager
+            return cls._instances[key]
+
     def __init__(self, hosts_file: str = None):
         """
         Initialize the hosts manager.
@@ -23,37 +69,106 @@ class KnownHostsManager:
         """
         # Par défaut, on place known_hosts.json dans le dossier keys/
         if hosts_file is None:
-            keys_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'keys')
-            os.makedirs(keys_dir, exist_ok=True)
-            hosts_file = os.path.join(keys_dir, "known_hosts.json")
+            root = Path(__file__).resolve().parents[2]
+            keys_dir = root / "keys"
+            keys_dir.mkdir(exist_ok=True)
+            hosts_file = str(keys_dir / "known_hosts.json")
             # Migration automatique si l'ancien fichier existe à la racine
-            old_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "known_hosts.json")
-            if os.path.exists(old_path) and not os.path.exists(hosts_file):
-                try:
-                    os.rename(old_path, hosts_file)
-                    print(f"[LOG] known_hosts.json migrated to {hosts_file}")
-                except Exception as e:
-                    print(f"[LOG] Could not migrate known_hosts.json: {e}")
+            # (une fois le nouveau fichier en place, plus rien à vérifier)
+            if not os.path.exists(hosts_file):
+                old_path = str(root / "known_hosts.json")
+                if os.path.exists(old_path):
+                    try:
+                        os.rename(old_path, hosts_file)
+                        print(f"[LOG] known_hosts.json migrated to {hosts_file}")
+                    except Exception as e:
+                        print(f"[LOG] Could not migrate known_hosts.json: {e}")
         self.hosts_file = hosts_file
         self._data = self._load_data()
+        self._index_hosts()
+        self._index_nicknames()
+        self._dirty = False
+        self._last_flush = 0.0
+        self._flush_timer: Optional[threading.Timer] = None  # Trailing write of a deferred change
+        self._lock = threading.RLock()  # Serializes changes with writes from the flush timer
 
     def _load_data(self) -> Dict:
         """Load host data from file or create default structure."""
-        if os.path.exists(self.hosts_file):
-            with open(self.hosts_file, "r") as f:
-                data = json.load(f)
-                # Ensure required keys exist
-                if "hosts" not in data:
-                    data["hosts"] = {}
-                if "nicknames" not in data:
-                    data["nicknames"] = {}
-                return data
-        return {"hosts": {}, "nicknames": {}}
+        try:
+            with open(self.hosts_file, "rb") as f:
+                data = _loads(f.read())
+        except FileNotFoundError:
+            return {"hosts": {}, "nicknames": {}}
+        # Ensure required keys exist
+        if "hosts" not in data:
+            data["hosts"] = {}
+        if "nicknames" not in data:
+            data["nicknames"] = {}
+        return data
+
+    def _index_hosts(self) -> None:
+        """Rebuild the fingerprint -> addresses reverse index (not persisted)."""
+        by_fingerprint = defaultdict(list)
+        for address, fingerprint in self._data["hosts"].items():
+            by_fingerprint[fingerprint].append(address)
+        self._addresses_by_fp = by_fingerprint
+
+    def _unindex_host(self, address: str) -> None:
+        """Drop a known address from the fingerprint -> addresses index."""
+        fingerprint = self._data["hosts"].get(address)
+        if fingerprint is None:
+            return
+        addresses = self._addresses_by_fp[fingerprint]
+        addresses.remove(address)
+        if not addresses:
+            del self._addresses_by_fp[fingerprint]
+
+    def _index_nicknames(self) -> None:
+        """Rebuild the nickname -> fingerprint reverse index (first registered wins)."""
+        self._fp_by_nickname = {
+            nickname: fingerprint
+            for fingerprint, nickname in reversed(list(self._data["nicknames"].items()))
+        }
 
     def _save_data(self) -> None:
-        """Save host data to file."""
-        with open(self.hosts_file, "w") as f:
-            json.dump(self._data, f, indent=2)
+        """Save host data to file atomically (temp file + rename)."""
+        tmp_file = self.hosts_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(_dumps(self._data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.hosts_file)
+
+    def _mark_dirty(self) -> None:
+        """
+        Record a change and write it, or, if the file was written very recently,
+        schedule a single trailing write at the end of SAVE_INTERVAL.
+        """
+        with self._lock:
+            self._dirty = True
+            delay = self.SAVE_INTERVAL - (time.monotonic() - self._last_flush)
+            if delay <= 0:
+                self.flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(delay, self._flush_if_dirty)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_if_dirty(self) -> None:
+        """Write pending changes, if any."""
+        with self._lock:
+            if self._dirty:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the host data to file now."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._save_data()
+            self._dirty = False
+            self._last_flush = time.monotonic()
 
     def set_nickname(self, fingerprint: str, nickname: str) -> None:
         """
@@ -63,8 +178,29 @@ class KnownHostsManager:
             fingerprint: The peer's fingerprint
             nickname: The nickname to assign
         """
-        self._data["nicknames"][fingerprint] = nickname
-        self._save_data()
+        with self._lock:
+            nicknames = self._data["nicknames"]
+            old_nickname = nicknames.get(fingerprint)
+            nicknames[fingerprint] = nickname
+            if old_nickname is not None and self._fp_by_nickname.get(old_nickname) == fingerprint:
+                # Hand the old nickname to the next fingerprint still using it, if any
+                heir = next((fp for fp, name in nicknames.items() if name == old_nickname), None)
+                if heir is None:
+                    del self._fp_by_nickname[old_nickname]
+                else:
+                    self._fp_by_nickname[old_nickname] = heir
+            holder = self._fp_by_nickname.get(nickname)
+            if holder is None:
+                self._fp_by_nickname[nickname] = fingerprint
+            elif holder != fingerprint:
+                # Collision: the fingerprint registered first keeps the nickname
+                for fp in nicknames:
+                    if fp == fingerprint:
+                        self._fp_by_nickname[nickname] = fingerprint
+                        break
+                    if fp == holder:
+                        break
+            self._mark_dirty()
 
     def get_nickname(self, fingerprint: str) -> Optional[str]:
         """
@@ -105,8 +241,11 @@ class KnownHostsManager:
         if not self._validate_address(address):
             return False
 
-        self._data["hosts"][address] = fingerprint
-        self._save_data()
+        with self._lock:
+            self._unindex_host(address)
+            self._data["hosts"][address] = fingerprint
+            self._addresses_by_fp[fingerprint].append(address)
+            self._mark_dirty()
         print(f"Host {address} with fingerprint {fingerprint} added successfully.")
         return True
 
@@ -120,14 +259,17 @@ class KnownHostsManager:
         Returns:
             True if removed, False if not found
         """
-        if address in self._data["hosts"]:
-            del self._data["hosts"][address]
-            self._save_data()
+        with self._lock:
+            found = address in self._data["hosts"]
+            if found:
+                self._unindex_host(address)
+                del self._data["hosts"][address]
+                self._mark_dirty()
+        if found:
             print(f"Host {address} removed successfully.")
-            return True
         else:
             print(f"Host {address} not found in known hosts.")
-            return False
+        return found
 
     def list_known_hosts(self) -> None:
         """Display all known hosts with their information."""
@@ -138,22 +280,21 @@ class KnownHostsManager:
             print("No registered hosts found.")
             return
             
-        print("Registered Hosts:")
-        print("------------------")
+        # Build the whole listing first and write it at once
+        lines = ["Registered Hosts:\n", "------------------\n"]
         for address, fingerprint in hosts.items():
             nickname = nicknames.get(fingerprint, "N/A")
             if self._is_onion_address(address):
-                print(f"Onion: {address:<40}")
-                print(f"Fingerprint: {fingerprint:<65} Nickname: {nickname}\n")
+                lines.append(f"Onion: {address:<40}\n")
             else:
-                if ':' in address:
-                    ip, port = address.split(':', 1)
-                    print(f"IP: {ip:<15} Port: {port:<5}")
-                    print(f"Fingerprint: {fingerprint:<65} Nickname: {nickname}\n")
+                ip, sep, port = address.rpartition(':')
+                if sep:
+                    lines.append(f"IP: {ip:<15} Port: {port:<5}\n")
                 else:
-                    print(f"Address: {address:<20}")
-                    print(f"Fingerprint: {fingerprint:<65} Nickname: {nickname}\n")
-        print("------------------")
+                    lines.append(f"Address: {address:<20}\n")
+            lines.append(f"Fingerprint: {fingerprint:<65} Nickname: {nickname}\n\n")
+        lines.append("------------------\n")
+        sys.stdout.write("".join(lines))
 
     def get_host_fingerprint(self, address: str) -> Optional[str]:
         """
@@ -171,10 +312,31 @@ class KnownHostsManager:
         """Get all fingerprints from known hosts."""
         return list(self._data.get("hosts", {}).values())
 
+    def get_addresses_by_fingerprint(self, fingerprint: str) -> List[str]:
+        """
+        Get all host addresses registered with a fingerprint.
+        
+        Args:
+            fingerprint: The fingerprint to look up
+            
+        Returns:
+            The addresses in registration order (empty if unknown)
+        """
+        return list(self._addresses_by_fp.get(fingerprint, ()))
+
+    def is_known_fingerprint(self, fingerprint: str) -> bool:
+        """Check whether a fingerprint belongs to any known host."""
+        return fingerprint in self._addresses_by_fp
+
     def _validate_fingerprint(self, fingerprint: str) -> bool:
         """Validate fingerprint format."""
-        return (len(fingerprint) == 64 and 
-                all(c in '0123456789abcdefABCDEF' for c in fingerprint))
+        if len(fingerprint) != 64:
+            return False
+        try:
+            # bytes.fromhex skips whitespace, so also check the decoded length
+            return len(bytes.fromhex(fingerprint)) == 32
+        except ValueError:
+            return False
 
     def _validate_address(self, address: str) -> bool:
         """Validate address format."""
@@ -189,21 +351,11 @@ class KnownHostsManager:
 
     def _validate_onion_address(self, address: str) -> bool:
         """Validate onion address format."""
-        if ':' in address:
-            onion, port = address.rsplit(':', 1)
-            if not onion.endswith('.onion'):
-                print("Error: Invalid .onion address format.")
-                return False
-            if port:
-                try:
-                    port_num = int(port)
-                    if not (0 < port_num < 65536):
-                        print("Error: Port number must be between 1 and 65535.")
-                        return False
-                except ValueError:
-                    print("Error: Port must be a valid number.")
-                    return False
-        return True
+        match = _ONION_RE.match(address)
+        if not match:
+            print("Error: Invalid .onion address format.")
+            return False
+        return self._validate_port(match.group(1))
 
     def _validate_ip_address(self, address: str) -> bool:
         """Validate IP address format."""
@@ -211,29 +363,28 @@ class KnownHostsManager:
             print("Error: Invalid IP:Port format. Port is missing.")
             print("Usage: <IP_ADDRESS>:<PORT>")
             return False
-            
-        parts = address.split(':')
-        if len(parts) != 2:
-            print("Error: Invalid IP:Port format. Expected format IP:Port.")
+        host, _, port = address.rpartition(':')
+        if host.startswith('[') and host.endswith(']'):
+            host = host[1:-1]  # Bracketed IPv6: [::1]:port
+        elif ':' in host:
+            print("Error: Invalid IP:Port format. IPv6 addresses must be written [IP]:Port.")
             return False
-            
-        ip_address = parts[0]
-        port_str = parts[1]
-        
-        if not ip_address:
-            print("Error: IP address cannot be empty.")
-            return False
-            
         try:
-            port = int(port_str)
-            if not (0 < port < 65536):
-                print("Error: Port number must be between 1 and 65535.")
-                return False
+            ipaddress.ip_address(host)
         except ValueError:
+            print("Error: Invalid IP address.")
+            return False
+        if not (port.isascii() and port.isdigit()):
             print("Error: Port must be a valid number.")
             return False
-            
-        return True 
+        return self._validate_port(port)
+
+    def _validate_port(self, port: Optional[str]) -> bool:
+        """Validate an optional, already digit-only, port number."""
+        if port and not (0 < int(port) < 65536):
+            print("Error: Port number must be between 1 and 65535.")
+            return False
+        return True
 
     def get_fingerprint_by_nickname(self, nickname: str) -> Optional[str]:
         """
@@ -245,10 +396,7 @@ class KnownHostsManager:
         Returns:
             The fingerprint if found, None otherwise
         """
-        for fp, nick in self._data.get("nicknames", {}).items():
-            if nick == nickname:
-                return fp
-        return None
+        return self._fp_by_nickname.get(nickname)
     
     def get_onion_by_fingerprint(self, fingerprint: str) -> Optional[str]:
         """
@@ -260,7 +408,7 @@ class KnownHostsManager:
         Returns:
             The onion address if found, None otherwise
         """
-        for address, fp in self._data.get("hosts", {}).items():
-            if fp == fingerprint and self._is_onion_address(address):
+        for address in self._addresses_by_fp.get(fingerprint, ()):
+            if self._is_onion_address(address):
                 return address
         return None
\ No newline at end of file
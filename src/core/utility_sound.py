@@ -1,30 +1,73 @@
+import functools
 import numpy as np
-#import sounddevice as sd
-import time
+import threading
+
+# sounddevice is optional (not in requirements.txt): without it, notifications are skipped
+try:
+    import sounddevice as sd
+except ImportError:
+    sd = None
 
 SAMPLE_RATE = 5000  # Sample rate in Hz
 NOTE_DURATION = 0.2  # Duration of each note in seconds
 VOLUME = 0.7         # Volume (between 0.0 and 1.0)
 
+# One period of a sine, indexed by the top bits of a 32-bit phase accumulator
+_LUT_BITS = 10
+_SIN_LUT = np.sin(2. * np.pi * np.arange(1 << _LUT_BITS) / (1 << _LUT_BITS)).astype(np.float32)
+
+@functools.lru_cache(maxsize=32)
+def _generate_wave(frequency, duration, volume, samplerate):
+    """
+    Generates the sine wave of a note from the lookup table (no libm sin per sample).
+    Waves are cached (notifications reuse the same few notes), so the
+    returned array is read-only.
+    """
+    num_samples = int(samplerate * duration)
+    phase_step = np.uint32(round(frequency * 2**32 / samplerate) & 0xFFFFFFFF)
+    phase = np.arange(num_samples, dtype=np.uint32) * phase_step  # Wraps modulo 2**32
+    wave = _SIN_LUT[phase >> (32 - _LUT_BITS)] * np.float32(volume)
+    wave.setflags(write=False)
+    return wave
+
+@functools.lru_cache(maxsize=8)
+def _render_melody(melody, duration, volume, samplerate):
+    """
+    Concatenates the notes of a melody (zeros for rests) into a single buffer,
+    so it can be played with one call instead of one play/wait per note.
+    """
+    silence = np.zeros(int(samplerate * duration), dtype=np.float32)
+    waves = [_generate_wave(frequency, duration, volume, samplerate) if frequency > 0 else silence
+             for frequency in melody]
+    full = np.concatenate(waves)
+    full.setflags(write=False)
+    return full
+
+def _play_melody(melody, duration, volume, samplerate):
+    """Plays the whole melody in one go (run in a background thread)."""
+    if not melody:
+        return
+    full = _render_melody(melody, duration, volume, samplerate)
+    try:
+        sd.play(full, samplerate)
+    except Exception:
+        pass  # No usable output device: a notification is not worth an error
+
 def play_notes(melody, duration=NOTE_DURATION, volume=VOLUME, samplerate=SAMPLE_RATE):
     
     """
     Plays a sequence of frequencies (notes).
     A frequency of 0 results in a silence (rest).
+    Returns immediately: playback happens in a daemon thread so the caller is not blocked.
+    Does nothing (no rendering, no thread) when sounddevice is not installed.
     """
-    num_samples = int(samplerate * duration)
-    t = np.linspace(0., duration, num_samples, endpoint=False)
-    
-    for frequency in melody:
-        if frequency > 0:
-            # Generate sine wave for the frequency
-            wave = volume * np.sin(2. * np.pi * frequency * t)
-
-            #sd.play(wave, samplerate)
-            #sd.wait() # Wait until the note is completely played
-            
-        else:
-            time.sleep(duration) # Pause for the duration of the rest
+    if sd is None:
+        return
+    threading.Thread(
+        target=_play_melody,
+        args=(tuple(melody), duration, volume, samplerate),
+        daemon=True
+    ).start()
 
 
 def play_incoming_call_sound():
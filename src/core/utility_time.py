@@ -0,0 +1,16 @@
+import time
+
+_cached_hms = (-1, "")  # Last formatted wall-clock second and its HH:MM:SS string
+
+
+def now_hms() -> str:
+    """
+    Current local time as HH:MM:SS, for message and log prefixes.
+    The string is rebuilt only when the wall-clock second changes.
+    """
+    global _cached_hms
+    second = int(time.time())
+    if second != _cached_hms[0]:
+        t = time.localtime(second)
+        _cached_hms = (second, f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}")
+    return _cached_hms[1]
@@ -5,7 +5,6 @@ Base P2P connection management: server, general state, shutdown.
 import socket
 import threading
 from typing import Callable, Optional, Tuple
-from datetime import datetime
 import os
 from colorama import Fore, Style
 import socks
@@ -31,22 +30,24 @@ class P2PConnection:
         self.listen_port = listen_port
         self.message_callback = message_callback
         self.crypto = CryptoManager()
-        self.hosts_manager = KnownHostsManager()
+        self.hosts_manager = KnownHostsManager.get()
         self.connected = False
         self.socket: Optional[socket.socket] = None
         self.peer_socket: Optional[socket.socket] = None
         self._stop_flag = threading.Event()
         self._server_running = False
         self._message_count = 0
-        self._last_renewal_time: Optional[datetime] = None
+        self._last_renewal_time: Optional[float] = None  # time.monotonic() of the last (re)connection
         self._peer_connection_details: Optional[Tuple[str, int]] = None
         self._is_server_mode = False
         self._reconnect_in_progress = threading.Event()
         self._accept_thread: Optional[threading.Thread] = None
+        # Self-pipe used by close_server() to wake the accept thread out of select()
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
         self._receive_thread: Optional[threading.Thread] = None
-        self._renewal_thread: Optional[threading.Thread] = None
-        self._ping_responses = {}
-        self._ping_lock = threading.Lock()
+        self._renewal_timer: Optional[threading.Timer] = None
+        self._ping_responses = {}  # ping id -> Future resolved with the pong time
         self._pending_file_path = None
 
     def start_server(self) -> None:
@@ -62,6 +63,7 @@ class P2PConnection:
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.socket.bind(('127.0.0.1', self.listen_port))
             self.socket.listen(1)
+            self._wake_r, self._wake_w = socket.socketpair()
             self._is_server_mode = True
             self._accept_thread = threading.Thread(target=self._accept_connections, daemon=True)
             self._accept_thread.start()
@@ -71,6 +73,7 @@ class P2PConnection:
             if self.socket:
                 self.socket.close()
                 self.socket = None
+            self._close_wake_pair()
 
     def stop(self) -> None:
         """
@@ -83,14 +86,29 @@ class P2PConnection:
         Close the server socket (to be called only at application exit).
         """
         self._server_running = False
+        if self._wake_w:
+            try:
+                self._wake_w.send(b'x')
+            except OSError:
+                pass
+        if self._accept_thread and self._accept_thread.is_alive():
+            self._accept_thread.join(timeout=2)
         if self.socket:
             try:
                 self.socket.close()
             except:
                 pass
             self.socket = None
-        if self._accept_thread and self._accept_thread.is_alive():
-            self._accept_thread.join(timeout=2)
+        self._close_wake_pair()
+
+    def _close_wake_pair(self) -> None:
+        """
+        Close the accept thread wake-up socket pair.
+        """
+        for sock in (self._wake_r, self._wake_w):
+            if sock:
+                sock.close()
+        self._wake_r = self._wake_w = None
 
     def _stop_peer_connection(self) -> None:
         """
@@ -98,9 +116,12 @@ class P2PConnection:
         Closes the peer socket and stops related threads.
         """
         self.connected = False
+        self._peer_nickname = None
+        self._peer_prefix = None
         self._close_peer_socket()
-        # Stop threads
-        if self._receive_thread and self._receive_thread.is_alive():
+        if self._renewal_timer:
+            self._renewal_timer.cancel()
+            self._renewal_timer = None
+        # Stop threads (the receive thread itself may be the caller, e.g. on peer disconnection)
+        if self._receive_thread and self._receive_thread.is_alive() and self._receive_thread is not threading.current_thread():
             self._receive_thread.join(timeout=1)
-        if self._renewal_thread and self._renewal_thread.is_alive():
-            self._renewal_thread.join(timeout=1) 
\ No newline at end of file
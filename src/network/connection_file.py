@@ -1,11 +1,38 @@
 # File transfer management mixin for P2PConnection
 import os
-import ast
+import queue
+import threading
+
+# Checked with a single startswith() before dispatching
+_FILE_TRANSFER_TAGS = ("__FILE_REQUEST__", "__FILE_ACCEPT__", "__FILE_DECLINE__", "__FILE_END__")
 
 class FileTransferMixin:
     """
     Mixin for file sending/receiving in P2PConnection.
     """
+    FILE_CHUNK_SIZE = 256 * 1024  # Large chunks amortize the per-frame syscalls and GCM overhead
+    CHUNK_OVERHEAD = 12 + 16  # Nonce and GCM tag added to each encrypted chunk
+    SEND_BATCH_SIZE = 1 << 20  # Encrypted bytes queued before they are written to the socket
+    FILE_WRITE_BUFFER = 1 << 20  # Received chunks are coalesced into writes of this size
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Reusable chunk buffers, so a transfer does not allocate per chunk
+        # (one transfer at a time per direction: sending from the UI, receiving from the receive thread)
+        self._send_buf = bytearray(self.FILE_CHUNK_SIZE)
+        self._recv_buf = bytearray(self.FILE_CHUNK_SIZE + self.CHUNK_OVERHEAD)
+        self._plain_buf = bytearray(self.FILE_CHUNK_SIZE)
+
+    @staticmethod
+    def _preallocate(file_obj, file_size: int) -> None:
+        """Reserve disk space for an incoming file when the platform supports it."""
+        if not file_size:
+            return
+        try:
+            os.posix_fallocate(file_obj.fileno(), 0, file_size)
+        except (AttributeError, OSError):
+            pass  # Not available on this platform or file system: the file just grows as it is written
+
     def send_file(self, file_path: str, callback=None) -> None:
         """
         Send a file to the peer.
@@ -18,11 +45,8 @@ class FileTransferMixin:
             return
         file_size = os.path.getsize(file_path)
         file_name = os.path.basename(file_path)
-        request_data = {
-            "file_name": file_name,
-            "file_size": file_size
-        }
-        self.send_message(f"__FILE_REQUEST__{request_data}")
+        # Compact "<size>:<name>" payload: the size never contains ':', the name may
+        self.send_message(f"__FILE_REQUEST__{file_size}:{file_name}")
         self._pending_file_path = file_path
 
     def send_file_data(self, file_path: str, callback=None) -> None:
@@ -32,19 +56,73 @@ class FileTransferMixin:
             file_path: Path to the file to send.
             callback: Progress callback function.
         """
+        try:
+            total = os.path.getsize(file_path)
+        except OSError as e:
+            self.message_callback(f"Error sending file: {str(e)}")
+            return
+        # The reader thread reads and encrypts the next chunks while this thread writes to the socket
+        chunks = queue.Queue(maxsize=max(1, self.SEND_BATCH_SIZE // self.FILE_CHUNK_SIZE))
+        abort = threading.Event()
+        reader = threading.Thread(target=self._read_encrypted_chunks, args=(file_path, chunks, abort), daemon=True)
+        reader.start()
+        try:
+            # Encrypted chunks are queued and written together, one sendmsg() per SEND_BATCH_SIZE bytes
+            pending = []
+            pending_size = 0
+            sent = 0
+            while True:
+                item = chunks.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is not None:
+                    n, encrypted_chunk = item
+                    pending.append(encrypted_chunk)
+                    pending_size += len(encrypted_chunk)
+                    sent += n
+                else:
+                    # The end marker goes out in the same write as the last chunks
+                    pending.append(self.crypto.encrypt_message("__FILE_END__"))
+                if item is None or pending_size >= self.SEND_BATCH_SIZE:
+                    self._send_raw_batch(pending)
+                    pending = []
+                    pending_size = 0
+                    if callback and total:
+                        callback(sent / total)
+                if item is None:
+                    break
+        except Exception as e:
+            self.message_callback(f"Error sending file: {str(e)}")
+        finally:
+            abort.set()
+            # Unblock the reader if it is waiting on a full queue
+            while reader.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def _read_encrypted_chunks(self, file_path: str, chunks: queue.Queue, abort: threading.Event) -> None:
+        """
+        Reader side of send_file_data: queue (plaintext size, encrypted chunk) pairs,
+        then None at the end of the file, or the exception that stopped the reading.
+        Args:
+            file_path: Path to the file to send.
+            chunks: Queue consumed by send_file_data.
+            abort: Set by send_file_data when it stops consuming.
+        """
+        view = memoryview(self._send_buf)
         try:
             with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(8192)
-                    if not chunk:
+                while not abort.is_set():
+                    n = f.readinto(self._send_buf)
+                    if not n:
                         break
-                    encrypted_chunk = self.crypto.encrypt_bytes(chunk)
-                    self._send_raw(encrypted_chunk)
-                    if callback:
-                        callback(f.tell() / os.path.getsize(file_path))
-            self.send_message("__FILE_END__")
+                    chunks.put((n, self.crypto.encrypt_bytes(view[:n])))
         except Exception as e:
-            self.message_callback(f"Error sending file: {str(e)}")
+            chunks.put(e)
+            return
+        chunks.put(None)
 
     def receive_file(self, file_name: str, file_size: int, save_dir: str = "received_files", callback=None) -> str:
         """
@@ -59,17 +137,20 @@ class FileTransferMixin:
         """
         os.makedirs(save_dir, exist_ok=True)
         file_path = os.path.join(save_dir, file_name)
-        with open(file_path, 'wb') as f:
+        with open(file_path, 'wb', buffering=self.FILE_WRITE_BUFFER) as f:
+            self._preallocate(f, file_size)
             received_size = 0
             while received_size < file_size:
-                chunk = self._receive_raw()
+                chunk = self._receive_raw_into(self._recv_buf)
                 if not chunk:
                     break
-                decrypted_chunk = self.crypto.decrypt_bytes(chunk)
+                decrypted_chunk = self.crypto.decrypt_bytes_into(chunk, self._plain_buf)
                 f.write(decrypted_chunk)
                 received_size += len(decrypted_chunk)
                 if callback:
                     callback(received_size / file_size)
+            if received_size < file_size:
+                f.truncate(received_size)  # Connection lost: drop the preallocated tail
         return file_path
 
     def _handle_file_transfer(self, message: str) -> bool:
@@ -80,19 +161,41 @@ class FileTransferMixin:
         Returns:
             True if handled as file transfer protocol, False otherwise.
         """
-        if message.startswith("__FILE_REQUEST__"):
-            req = ast.literal_eval(message[len("__FILE_REQUEST__"):])
-            file_name = req['file_name']
-            file_size = req['file_size']
-            self.message_callback(f"Peer wants to send you a file: {file_name} ({file_size} bytes)")
-            return True
-        elif message.startswith("__FILE_ACCEPT__"):
-            self.message_callback("Peer accepted file transfer. Sending file...")
-            return True
-        elif message.startswith("__FILE_DECLINE__"):
-            self.message_callback("Peer declined the file transfer.")
-            return True
-        elif message.startswith("__FILE_END__"):
-            self.message_callback("File transfer completed.")
+        if not message.startswith(_FILE_TRANSFER_TAGS):
+            return False
+        tag = message[:message.index("__", 2) + 2]
+        return FileTransferMixin._FILE_TRANSFER_HANDLERS[tag](self, message[len(tag):])
+
+    def _on_file_request(self, payload: str) -> bool:
+        """Announce an incoming file request ("<size>:<name>" payload)."""
+        size, _, file_name = payload.partition(':')
+        try:
+            file_size = int(size)
+        except ValueError:
+            self.message_callback("> [ERROR] Invalid file request.")
             return True
-        return False 
\ No newline at end of file
+        self.message_callback(f"Peer wants to send you a file: {file_name} ({file_size} bytes)")
+        return True
+
+    def _on_file_accept(self, payload: str) -> bool:
+        """Peer accepted our file request."""
+        self.message_callback("Peer accepted file transfer. Sending file...")
+        return True
+
+    def _on_file_decline(self, payload: str) -> bool:
+        """Peer declined our file request."""
+        self.message_callback("Peer declined the file transfer.")
+        return True
+
+    def _on_file_end(self, payload: str) -> bool:
+        """Peer finished sending the file."""
+        self.message_callback("File transfer completed.")
+        return True
+
+    # File transfer tag -> handler (called with the rest of the message)
+    _FILE_TRANSFER_HANDLERS = {
+        "__FILE_REQUEST__": _on_file_request,
+        "__FILE_ACCEPT__": _on_file_accept,
+        "__FILE_DECLINE__": _on_file_decline,
+        "__FILE_END__": _on_file_end,
+    }
@@ -1,11 +1,44 @@
 # Handshake and authentication mixin for P2PConnection
-from datetime import datetime
-import json
 import os
+import struct
+import threading
 from colorama import Fore, Style
+from src.core.utility_time import now_hms
 import time
 from src.core.utility_sound import play_incoming_call_sound
 
+# Handshake records are a sequence of binary fields, each prefixed with its 2-byte length
+_FIELD_LENGTH = struct.Struct('!H')
+
+
+def _pack_fields(*fields: bytes) -> bytes:
+    """Pack binary fields into one length-prefixed handshake record."""
+    return b''.join(_FIELD_LENGTH.pack(len(field)) + field for field in fields)
+
+
+def _unpack_fields(record: bytes, count: int) -> list:
+    """
+    Unpack exactly `count` length-prefixed fields from a handshake record.
+    Raises:
+        ValueError: If the record is truncated or has trailing data.
+    """
+    view = memoryview(record)
+    fields = []
+    offset = 0
+    for _ in range(count):
+        if offset + _FIELD_LENGTH.size > len(record):
+            raise ValueError("Truncated handshake record")
+        (length,) = _FIELD_LENGTH.unpack_from(record, offset)
+        offset += _FIELD_LENGTH.size
+        if offset + length > len(record):
+            raise ValueError("Truncated handshake record")
+        fields.append(bytes(view[offset:offset + length]))  # The key parser wants bytes
+        offset += length
+    if offset != len(record):
+        raise ValueError("Unexpected data in handshake record")
+    return fields
+
+
 class HandshakeMixin:
     """
     Mixin for handshake and authentication logic in P2PConnection.
@@ -23,43 +56,30 @@ class HandshakeMixin:
         try:
             challenge = os.urandom(32)
             if send_public_key_first:
-                handshake_data = {
-                    "public_key": self.crypto.get_public_bytes().hex(),
-                    "challenge": challenge.hex()
-                }
-                self._send_raw(json.dumps(handshake_data).encode())
-                response_data = json.loads(self._receive_raw().decode())
-                peer_public_key_bytes = bytes.fromhex(response_data["public_key"])
-                peer_challenge = bytes.fromhex(response_data["challenge"])
-                peer_signature = bytes.fromhex(response_data["signature"])
+                self._send_raw(_pack_fields(self.crypto.get_public_bytes(), challenge))
+                peer_public_key_bytes, peer_challenge, peer_signature = _unpack_fields(self._receive_raw(), 3)
                 if not self.crypto.verify_signature(peer_public_key_bytes, challenge, peer_signature):
                     self.message_callback("Peer authentication failed: Invalid signature")
                     return False
                 self.crypto.set_peer_public_key(peer_public_key_bytes)
+                self.crypto.establish_session(challenge, peer_challenge, initiator=True)
                 my_signature = self.crypto.sign_challenge(peer_challenge)
-                signature_data = {"signature": my_signature.hex()}
-                self._send_raw(json.dumps(signature_data).encode())
+                self._send_raw(_pack_fields(my_signature))
             else:
-                handshake_data = json.loads(self._receive_raw().decode())
-                peer_public_key_bytes = bytes.fromhex(handshake_data["public_key"])
-                peer_challenge = bytes.fromhex(handshake_data["challenge"])
-                self.crypto.set_peer_public_key(peer_public_key_bytes)
+                peer_public_key_bytes, peer_challenge = _unpack_fields(self._receive_raw(), 2)
                 my_signature = self.crypto.sign_challenge(peer_challenge)
-                response_data = {
-                    "public_key": self.crypto.get_public_bytes().hex(),
-                    "challenge": challenge.hex(),
-                    "signature": my_signature.hex()
-                }
-                self._send_raw(json.dumps(response_data).encode())
-                signature_data = json.loads(self._receive_raw().decode())
-                peer_signature = bytes.fromhex(signature_data["signature"])
+                self._send_raw(_pack_fields(self.crypto.get_public_bytes(), challenge, my_signature))
+                (peer_signature,) = _unpack_fields(self._receive_raw(), 1)
                 if not self.crypto.verify_signature(peer_public_key_bytes, challenge, peer_signature):
                     self.message_callback("Peer authentication failed: Invalid signature")
                     return False
+                # Only install the peer key once its owner has proven it holds the private key
+                self.crypto.set_peer_public_key(peer_public_key_bytes)
+                self.crypto.establish_session(challenge, peer_challenge, initiator=False)
             if peer_ip and peer_port:
                 if not self._verify_tofu_identity(peer_ip, peer_port, "client" if send_public_key_first else "server"):
                     return False
-            self.message_callback(Fore.LIGHTGREEN_EX + f"[{datetime.now().strftime('%H:%M:%S')}] Secure connection established" + Style.RESET_ALL)
+            self.message_callback(Fore.LIGHTGREEN_EX + f"[{now_hms()}] Secure connection established" + Style.RESET_ALL)
             play_incoming_call_sound()
             return True
         except Exception as e:
@@ -79,9 +99,8 @@ class HandshakeMixin:
         try:
             peer_fingerprint = self.crypto.get_peer_fingerprint()
             # > Strict verification: only accept if peer_fingerprint is already in known_hosts.json
-            known_fingerprints = self.hosts_manager.get_all_fingerprints()
-            if peer_fingerprint in known_fingerprints:
-                self.message_callback(Fore.LIGHTGREEN_EX + f"[{datetime.now().strftime('%H:%M:%S')}] Peer identity verified: {peer_fingerprint}" + Style.RESET_ALL)
+            if self.hosts_manager.is_known_fingerprint(peer_fingerprint):
+                self.message_callback(Fore.LIGHTGREEN_EX + f"[{now_hms()}] Peer identity verified: {peer_fingerprint}" + Style.RESET_ALL)
                 return True
             else:
                 self.message_callback(f"Connection refused: unknown peer fingerprint {peer_fingerprint}")
@@ -94,18 +113,16 @@ class HandshakeMixin:
     def _initialize_renewal_trackers(self) -> None:
         """
         Initialize connection renewal tracking variables.
+        Schedules a single timer for the time-based renewal; the message-count
+        renewal is checked by the receive loop.
         """
         self._message_count = 0
-        self._last_renewal_time = datetime.now()
-
-    def _renewal_monitor(self) -> None:
-        """
-        Monitor connection for renewal conditions.
-        """
-        while self.connected and not self._stop_flag.is_set():
-            time.sleep(60)
-            if self._should_renew_connection():
-                self._trigger_reconnection()
+        self._last_renewal_time = time.monotonic()
+        if self._renewal_timer:
+            self._renewal_timer.cancel()
+        self._renewal_timer = threading.Timer(self.RENEW_AFTER_MINUTES * 60, self._trigger_reconnection)
+        self._renewal_timer.daemon = True
+        self._renewal_timer.start()
 
     def _should_renew_connection(self) -> bool:
         """
@@ -115,7 +132,7 @@ class HandshakeMixin:
         """
         if not self._last_renewal_time:
             return False
-        time_elapsed = (datetime.now() - self._last_renewal_time).total_seconds() / 60
+        time_elapsed = (time.monotonic() - self._last_renewal_time) / 60
         return (self._message_count >= self.RENEW_AFTER_MESSAGES or 
                 time_elapsed >= self.RENEW_AFTER_MINUTES)
 
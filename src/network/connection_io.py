@@ -1,43 +1,174 @@
 # Low-level socket I/O mixin for P2PConnection
+import socket
+import struct
+
+_SHORT_LENGTH = struct.Struct('!H')
+_LONG_LENGTH = struct.Struct('!I')
 
 class IOMixin:
     """
     Mixin for low-level socket I/O in P2PConnection.
     """
+    SOCKET_BUFFER_SIZE = 1 << 20  # Room for several file chunks in flight
+    IOV_MAX = 1024  # Maximum number of buffers accepted by one sendmsg() call
+    # Frame headers: 2 bytes for frames under 32 KiB, 4 bytes (high bit set) for larger ones
+    SHORT_FRAME_LIMIT = 1 << 15
+    LONG_FRAME_FLAG = 1 << 31
+
+    def _tune_peer_socket(self, sock: socket.socket, nodelay: bool = True) -> None:
+        """
+        Apply the socket options used for peer connections.
+        Args:
+            sock: Peer socket (before connect() for outgoing connections).
+            nodelay: Disable Nagle's algorithm, so small frames (pings, chat) are sent immediately.
+        """
+        options = [
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE),
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        if nodelay:
+            options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        for level, option, value in options:
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                pass  # Proxied sockets may reject some options; they are only tuning
+
     def _send_raw(self, data: bytes) -> None:
         """
         Send raw data to the peer.
         Args:
             data: Bytes to send.
         """
-        if self.peer_socket:
-            length = len(data)
-            self.peer_socket.send(length.to_bytes(4, 'big'))
-            self.peer_socket.send(data)
+        self._send_raw_batch((data,))
+
+    def _send_raw_batch(self, frames) -> None:
+        """
+        Send several frames to the peer with as few system calls as possible.
+        Length prefixes and payloads are passed to sendmsg() as one iovec, without concatenating them.
+        Args:
+            frames: Iterable of byte strings, each sent as its own length-prefixed frame.
+        """
+        if not self.peer_socket:
+            return
+        buffers = []
+        for data in frames:
+            buffers.append(self._frame_header(len(data)))
+            buffers.append(data)
+        sendmsg = getattr(self.peer_socket, 'sendmsg', None)
+        if sendmsg is None:  # Windows
+            self.peer_socket.sendall(b''.join(buffers))
+            return
+        views = [memoryview(buffer) for buffer in buffers]
+        first = 0
+        while first < len(views):
+            sent = sendmsg(views[first:first + self.IOV_MAX])
+            # Skip what was fully written and resume inside a partially written buffer
+            while first < len(views) and sent >= views[first].nbytes:
+                sent -= views[first].nbytes
+                first += 1
+            if sent:
+                views[first] = views[first][sent:]
+
+    def _frame_header(self, length: int) -> bytes:
+        """
+        Encode a frame length prefix.
+        Args:
+            length: Payload length in bytes.
+        Returns:
+            A 2-byte header for short frames, or a 4-byte header with the high bit set.
+        """
+        if length < self.SHORT_FRAME_LIMIT:
+            return _SHORT_LENGTH.pack(length)
+        if length >= self.LONG_FRAME_FLAG:
+            raise ValueError("Frame too large")
+        return _LONG_LENGTH.pack(length | self.LONG_FRAME_FLAG)
 
-    def _receive_raw(self) -> bytes:
+    def _receive_frame_length(self):
+        """
+        Read a frame length prefix from the peer.
+        Returns:
+            The payload length, or None if the peer closed the connection.
+        """
+        head = bytearray(_LONG_LENGTH.size)
+        view = memoryview(head)
+        if not self._recv_exact_into(view[:_SHORT_LENGTH.size]):
+            return None
+        if not head[0] & 0x80:
+            return _SHORT_LENGTH.unpack_from(head)[0]
+        if not self._recv_exact_into(view[_SHORT_LENGTH.size:]):
+            return None
+        return _LONG_LENGTH.unpack_from(head)[0] & ~self.LONG_FRAME_FLAG
+
+    def _receive_raw(self) -> bytearray:
         """
         Receive raw data from the peer.
         Returns:
-            Bytes received, or empty bytes if error.
+            Bytes received (a fresh buffer, returned without an extra copy), or empty bytes if error.
         """
         if not self.peer_socket:
             return b''
         try:
-            length_bytes = self.peer_socket.recv(4)
-            if not length_bytes:
+            length = self._receive_frame_length()
+            if length is None:
                 return b''
-            length = int.from_bytes(length_bytes, 'big')
-            data = b''
-            while len(data) < length:
-                chunk = self.peer_socket.recv(length - len(data))
-                if not chunk:
-                    return b''
-                data += chunk
-            return data
+            return self._recv_exact(length)
         except Exception:
             return b''
 
+    def _receive_raw_into(self, buf: bytearray) -> memoryview:
+        """
+        Receive raw data from the peer into a caller-owned buffer.
+        A frame larger than the buffer is read into a fresh one instead.
+        Args:
+            buf: Reusable buffer to receive into.
+        Returns:
+            View of the received frame (valid until the buffer is reused), or an empty view if error.
+        """
+        if not self.peer_socket:
+            return memoryview(b'')
+        try:
+            length = self._receive_frame_length()
+            if length is None:
+                return memoryview(b'')
+            if length > len(buf):
+                buf = bytearray(length)
+            view = memoryview(buf)[:length]
+            if not self._recv_exact_into(view):
+                return memoryview(b'')
+            return view
+        except Exception:
+            return memoryview(b'')
+
+    def _recv_exact(self, length: int) -> bytearray:
+        """
+        Read exactly `length` bytes from the peer into a single preallocated buffer.
+        Args:
+            length: Number of bytes to read.
+        Returns:
+            The filled buffer, or an empty one if the peer closed the connection.
+        """
+        buf = bytearray(length)
+        if not self._recv_exact_into(memoryview(buf)):
+            return bytearray()
+        return buf
+
+    def _recv_exact_into(self, view: memoryview) -> bool:
+        """
+        Fill `view` completely with bytes from the peer.
+        Returns:
+            False if the peer closed the connection first.
+        """
+        received = 0
+        length = len(view)
+        while received < length:
+            n = self.peer_socket.recv_into(view[received:])
+            if not n:
+                return False
+            received += n
+        return True
+
     def _close_peer_socket(self) -> None:
         """
         Close the peer socket cleanly.
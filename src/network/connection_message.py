@@ -1,11 +1,21 @@
 # Message and ping management mixin for P2PConnection
-from datetime import datetime
-from re import A
+import asyncio
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import itertools
+import os
+import sys
+import threading
 import time
 from colorama import Fore, Style
+from src.core.utility_time import now_hms
 import src.core.file_transfer as file_transfer
-import os
-from src.core.utility_sound import play_message_received_sound
+from src.network.connection_file import FileTransferMixin
+
+_PING_PONG_TAGS = ("__PING__", "__PONG__")
+
+# Every possible file-receive progress bar, built once
+_PROGRESS_BAR_LEN = 30
+_PROGRESS_BARS = tuple('#' * i + '-' * (_PROGRESS_BAR_LEN - i) for i in range(_PROGRESS_BAR_LEN + 1))
 
 class MessageMixin:
     """
@@ -15,104 +25,116 @@ class MessageMixin:
         super().__init__(*args, **kwargs)
         self._receiving_file = False  # Always initialize here to avoid attribute errors
         self._file_receive_info = None  # dict: name, size, received, file_obj
+        self._ping_counter = itertools.count(1)  # Ping ids, unique per connection object
+        self._peer_nickname = None  # Cached display name of the current peer
+        self._peer_prefix = None  # Cached prefix of the peer's messages
 
     def _receive_messages(self) -> None:
         """
         Thread for receiving and processing messages.
         """
         while self.connected and not self._stop_flag.is_set():
-            # print("ON EST DANS LE _RECEIVE_MESSAGES et le _receiving_file est 3", self._receiving_file)
             try:
-                # print("ON EST PAS ENCORE DANS LE MODE RECEPTION DE FICHIER et le _receiving_file est 4", self._receiving_file)
                 if not self.peer_socket:
                     break
-                # Binary file receiving mode
-                
+                # Binary file receiving mode, or encrypted text messages
                 if self._receiving_file:
-                    # If the protocol was reset (declined or completed), exit file receiving mode
-                    if not file_transfer.FILE_TRANSFER_BOOL:
-                        self._receiving_file = False
-                        self._file_receive_info = None
-                        continue  # Restart the main loop to handle the next message as normal
-                    # print("ON EST DANS LE MODE RECEPTION DE FICHIER")
-                    encrypted_chunk = self._receive_raw()
-                    if not encrypted_chunk:
-                        self.message_callback(Fore.LIGHTRED_EX + "> [ERROR] Connection lost during file transfer.\nDeconnexion from the peer." + Style.RESET_ALL)
-                        self._receiving_file = False
-                        if self._file_receive_info and self._file_receive_info['file_obj']:
-                            self._file_receive_info['file_obj'].close()
-                        file_transfer.reset_all_file_transfer_state()
-                        self.stop()
-                        break
-                    chunk = self.crypto.decrypt_bytes(encrypted_chunk)
-                    self._file_receive_info['file_obj'].write(chunk)
-                    self._file_receive_info['received'] += len(chunk)
-                    if not self._receiving_file:
-                        break
-                    # Progress bar display
-                    percent = self._file_receive_info['received'] / self._file_receive_info['size']
-                    bar_len = 30
-                    filled_len = int(bar_len * percent)
-                    bar = '#' * filled_len + '-' * (bar_len - filled_len)
-                    print(Fore.LIGHTYELLOW_EX + f"\r> [RECEIVING] |{bar}| {percent*100:5.1f}%" + Style.RESET_ALL, end='')
-                    if self._file_receive_info['received'] >= self._file_receive_info['size']:
-                        self._file_receive_info['file_obj'].close()
-                        print(Fore.LIGHTGREEN_EX + f"\n> [INFO] File received successfully and saved to received_files/{self._file_receive_info['name']}" + Style.RESET_ALL)
-                        file_transfer.reset_all_file_transfer_state()
-                        self._receiving_file = False
-                        self._file_receive_info = None
-                    continue
+                    keep_receiving = self._receive_file_chunk()
                 else:
-                    encrypted_data = self._receive_raw()
-                    if not encrypted_data:
-                        self.message_callback(Fore.LIGHTYELLOW_EX + "[INFO] The peer has closed the connection or disconnected." + Style.RESET_ALL)
-                        self.stop()
-                        break
-                    message = self.crypto.decrypt_message(encrypted_data)
-                    # Detection of file transfer acceptance (activate file receiving mode)
-                    if "__FILE_TRANSFER_ACCEPTED__" in message:
-                        if self._file_receive_info and self._file_receive_info['file_obj']:
-                            self._receiving_file = True
-                            continue
-                    # Detection of file transfer request (store info but do not activate receiving mode)
-                    if "__FILE_TRANSFER__" in message:
-                        idx = message.index("__FILE_TRANSFER__")
-                        file_info = message[idx + len("__FILE_TRANSFER__"):].strip().split()
-                        if len(file_info) >= 2:
-                            file_name = file_info[0]
-                            try:
-                                file_size = int(file_info[1])
-                            except ValueError:
-                                self.message_callback("> [ERROR] Invalid file transfer request.")
-                                continue
-                            os.makedirs('received_files', exist_ok=True)
-                            file_path = os.path.join('received_files', file_name)
-                            file_obj = open(file_path, 'wb')
-                            self._file_receive_info = {
-                                'name': file_name,
-                                'size': file_size,
-                                'received': 0,
-                                'file_obj': file_obj
-                            }
-                            self.message_callback(message)
-                            continue
-                    if self._handle_ping_pong(message):
-                        continue
-                    if self._handle_file_transfer(message):
-                        continue
-                    if message.strip() == "__DISCONNECT__":
-                        self.message_callback(Fore.LIGHTYELLOW_EX + "[INFO] The peer has disconnected." + Style.RESET_ALL)
-                        self.stop()
-                        return
-                    self._message_count += 1
-                    self.message_callback(Fore.LIGHTMAGENTA_EX + f"[ {self._get_peer_nickname()}  |  {datetime.now().strftime('%H:%M:%S')}]" + Style.RESET_ALL + f"{message}")
-                    #play_message_received_sound()
-
+                    keep_receiving = self._receive_text_message()
+                if not keep_receiving:
+                    break
             except Exception as e:
                 if not self._stop_flag.is_set():
                     self.message_callback(f"Error receiving message: {str(e)}")
                     break
 
+    def _receive_file_chunk(self) -> bool:
+        """
+        Receive one encrypted file chunk and append it to the file being received.
+        Returns:
+            False if the receive loop must stop, True otherwise.
+        """
+        # If the protocol was reset (declined or completed), exit file receiving mode
+        if not file_transfer.FILE_TRANSFER_BOOL:
+            self._receiving_file = False
+            self._close_received_file()
+            self._file_receive_info = None
+            return True  # Handle the next message as normal
+        encrypted_chunk = self._receive_raw_into(self._recv_buf)
+        if not encrypted_chunk:
+            self.message_callback(Fore.LIGHTRED_EX + "> [ERROR] Connection lost during file transfer.\nDeconnexion from the peer." + Style.RESET_ALL)
+            self._receiving_file = False
+            self._close_received_file()
+            file_transfer.reset_all_file_transfer_state()
+            self.stop()
+            return False
+        if self._file_receive_info['file_obj'] is None:
+            # The peer only sends chunks once the user accepted: create the file now
+            self._open_received_file()
+        chunk = self.crypto.decrypt_bytes_into(encrypted_chunk, self._plain_buf)
+        self._file_receive_info['file_obj'].write(chunk)
+        self._file_receive_info['received'] += len(chunk)
+        if not self._receiving_file:
+            return False
+        # Progress bar display, redrawn only when the shown percentage changes
+        size = self._file_receive_info['size']
+        received = min(self._file_receive_info['received'], size)
+        percent = received * 100 // size
+        if percent != self._file_receive_info['last_shown']:
+            self._file_receive_info['last_shown'] = percent
+            bar = _PROGRESS_BARS[received * _PROGRESS_BAR_LEN // size]
+            sys.stdout.write(Fore.LIGHTYELLOW_EX + f"\r> [RECEIVING] |{bar}| {percent:3d}%" + Style.RESET_ALL)
+            sys.stdout.flush()
+        if self._file_receive_info['received'] >= self._file_receive_info['size']:
+            self._file_receive_info['file_obj'].close()
+            print(Fore.LIGHTGREEN_EX + f"\n> [INFO] File received successfully and saved to received_files/{self._file_receive_info['name']}" + Style.RESET_ALL)
+            file_transfer.reset_all_file_transfer_state()
+            self._receiving_file = False
+            self._file_receive_info = None
+        return True
+
+    def _open_received_file(self) -> None:
+        """
+        Create the destination file of the accepted transfer and reserve its announced size.
+        """
+        os.makedirs('received_files', exist_ok=True)
+        file_path = os.path.join('received_files', self._file_receive_info['name'])
+        file_obj = open(file_path, 'wb', buffering=FileTransferMixin.FILE_WRITE_BUFFER)
+        FileTransferMixin._preallocate(file_obj, self._file_receive_info['size'])
+        self._file_receive_info['file_obj'] = file_obj
+
+    def _close_received_file(self) -> None:
+        """
+        Close an interrupted transfer's file, dropping the preallocated space that was never written.
+        """
+        if self._file_receive_info and self._file_receive_info['file_obj']:
+            self._file_receive_info['file_obj'].truncate(self._file_receive_info['received'])
+            self._file_receive_info['file_obj'].close()
+            self._file_receive_info['file_obj'] = None
+
+    def _receive_text_message(self) -> bool:
+        """
+        Receive one encrypted message and dispatch it as a control message or display it as chat.
+        Returns:
+            False if the receive loop must stop, True otherwise.
+        """
+        encrypted_data = self._receive_raw()
+        if not encrypted_data:
+            self.message_callback(Fore.LIGHTYELLOW_EX + "[INFO] The peer has closed the connection or disconnected." + Style.RESET_ALL)
+            self.stop()
+            return False
+        message = self.crypto.decrypt_message(encrypted_data)
+        if self._handle_control_message(message):
+            return True
+        self._message_count += 1
+        self.message_callback(self._peer_message_prefix() + now_hms() + "]" + Style.RESET_ALL + message)
+        if self._should_renew_connection():
+            # Renew from another thread: reconnecting stops (and joins) this one
+            threading.Thread(target=self._trigger_reconnection, daemon=True).start()
+            return False
+        return True
+
     def send_message(self, message: str) -> None:
         """
         Send an encrypted message to the peer.
@@ -123,7 +145,6 @@ class MessageMixin:
             return
         try:
             encrypted_data = self.crypto.encrypt_message(message)
-            # print(f"Encrypted data: {encrypted_data}")
             self._send_raw(encrypted_data)
         except Exception as e:
             self.message_callback(f"Error sending message: {str(e)}")
@@ -138,21 +159,104 @@ class MessageMixin:
         """
         if not self.connected:
             return None
-        ping_id = str(int(time.time() * 1000))
-        ping_message = f"__PING__{ping_id}"
-        with self._ping_lock:
-            self._ping_responses[ping_id] = None
-        start_time = time.time()
-        self.send_message(ping_message)
-        while time.time() - start_time < timeout:
-            with self._ping_lock:
-                if self._ping_responses.get(ping_id) is not None:
-                    response_time = self._ping_responses.pop(ping_id) - start_time
-                    return response_time
-            time.sleep(0.01)
-        with self._ping_lock:
+        ping_id, pong, start_time = self._send_ping()
+        try:
+            return pong.result(timeout) - start_time
+        except FutureTimeoutError:
+            return None
+        finally:
+            self._ping_responses.pop(ping_id, None)
+
+    async def ping_peer_async(self, timeout: float = 5.0) -> float:
+        """
+        Same as ping_peer, but awaits the pong instead of blocking the calling thread.
+        Args:
+            timeout: Timeout in seconds.
+        Returns:
+            Response time in seconds, or None if failed.
+        """
+        if not self.connected:
+            return None
+        ping_id, pong, start_time = self._send_ping()
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(pong), timeout) - start_time
+        except asyncio.TimeoutError:
+            return None
+        finally:
             self._ping_responses.pop(ping_id, None)
-        return None
+
+    def _send_ping(self) -> tuple:
+        """
+        Register a pending ping and send it.
+        Returns:
+            (ping id, Future resolved by the receive thread with the pong arrival time, send time).
+        """
+        ping_id = next(self._ping_counter)  # Int keys: cheap to hash, no string kept per ping
+        pong = Future()
+        self._ping_responses[ping_id] = pong
+        start_time = time.monotonic()
+        self.send_message(f"__PING__{ping_id}")
+        return ping_id, pong, start_time
+
+    def _handle_control_message(self, message: str) -> bool:
+        """
+        Dispatch a protocol message ("__TAG__...") to its handler with a single table lookup.
+        Args:
+            message: Decrypted message.
+        Returns:
+            True if handled, False if the message should be displayed as chat.
+        """
+        if not message.startswith("__"):
+            return False
+        end = message.find("__", 2)
+        if end < 0:
+            return False
+        handler = self._CONTROL_HANDLERS.get(message[:end + 2])
+        return handler(self, message) if handler else False
+
+    def _on_file_transfer_accepted(self, message: str) -> bool:
+        """
+        Activate file receiving mode when a transfer is pending on this side.
+        Otherwise the message goes on to the UI, which starts sending the file.
+        """
+        if self._file_receive_info:
+            self._receiving_file = True
+            return True
+        return False
+
+    def _on_file_transfer_request(self, message: str) -> bool:
+        """
+        Store the incoming file info (receiving mode is not activated yet).
+        The destination file is only created when the first chunk arrives, after the user accepted.
+        """
+        file_info = message[len("__FILE_TRANSFER__"):].split()
+        if len(file_info) < 2:
+            return False
+        file_name = file_info[0]
+        try:
+            file_size = int(file_info[1])
+        except ValueError:
+            self.message_callback("> [ERROR] Invalid file transfer request.")
+            return True
+        self._file_receive_info = {
+            'name': file_name,
+            'size': file_size,
+            'received': 0,
+            'file_obj': None,  # Opened by _open_received_file
+            'last_shown': -1  # Last percentage drawn
+        }
+        self.message_callback(message)
+        return True
+
+    def _on_disconnect(self, message: str) -> bool:
+        """
+        Close the session when the peer announces its disconnection.
+        """
+        if message.strip() != "__DISCONNECT__":
+            return False
+        self.message_callback(Fore.LIGHTYELLOW_EX + "[INFO] The peer has disconnected." + Style.RESET_ALL)
+        self.stop()
+        return True
 
     def _handle_ping_pong(self, message: str) -> bool:
         """
@@ -162,18 +266,21 @@ class MessageMixin:
         Returns:
             True if handled as ping/pong, False otherwise.
         """
-        if message.startswith("__PING__"):
-            ping_id = message[8:]
-            pong_response = f"__PONG__{ping_id}"
-            self.send_message(pong_response)
-            return True
-        elif message.startswith("__PONG__"):
-            ping_id = message[8:]
-            with self._ping_lock:
-                if ping_id in self._ping_responses:
-                    self._ping_responses[ping_id] = time.time()
-            return True
-        return False
+        if not message.startswith(_PING_PONG_TAGS):
+            return False
+        ping_id = message[8:]
+        if message[3] == 'I':  # "__PING__" and "__PONG__" only differ here
+            self.send_message(f"__PONG__{ping_id}")
+        else:
+            # pop() is atomic, so a pong resolves its ping at most once
+            try:
+                pong = self._ping_responses.pop(int(ping_id), None)
+            except ValueError:
+                return True  # Not one of our ping ids
+            # An async ping that timed out cancels its future: skip it then
+            if pong and pong.set_running_or_notify_cancel():
+                pong.set_result(time.monotonic())
+        return True
 
     def _handle_file_transfer(self, message: str) -> bool:
         """
@@ -185,7 +292,6 @@ class MessageMixin:
         """
         if message.startswith("__FILE_ACCEPT__"):
             self.activate_file_receiving_mode()
-            # print("ON MET LE MODE RECEPTION DE FICHIER A TRUE DANS LE FICHIER CONNECTION_MESSAGE.PY et le _receiving_file est 1", self._receiving_file)
             return True
         return False
 
@@ -194,20 +300,55 @@ class MessageMixin:
         Activate file receiving mode so that the next incoming data is treated as a file chunk.
         Should be called when the user sends /__FILE_ACCEPT__.
         """
-        if self._file_receive_info and self._file_receive_info['file_obj']:
+        if self._file_receive_info:
             self._receiving_file = True
-            # print("ON MET LE MODE RECEPTION DE FICHIER A TRUE DANS LE FICHIER CONNECTION_MESSAGE.PY")
 
     def _get_peer_nickname(self) -> str:
         """
-        Get the nickname of the connected peer.
+        Get the nickname of the connected peer (looked up once per session).
         Returns:
             Nickname or short fingerprint, or 'Unknown'.
         """
+        if self._peer_nickname is not None:
+            return self._peer_nickname
         try:
             peer_fingerprint = self.crypto.get_peer_fingerprint()
             nickname = self.hosts_manager.get_nickname(peer_fingerprint)
-            # print(f"Nickname: {nickname}")
-            return nickname if nickname else peer_fingerprint[:8]
+            self._peer_nickname = nickname if nickname else peer_fingerprint[:8]
+            return self._peer_nickname
         except:
-            return "Unknown" 
\ No newline at end of file
+            return "Unknown"
+
+    def _peer_message_prefix(self) -> str:
+        """
+        Colored "[ nickname  |  " prefix of received messages, built once per session.
+        """
+        if self._peer_prefix is None:
+            nickname = self._get_peer_nickname()
+            prefix = Fore.LIGHTMAGENTA_EX + f"[ {nickname}  |  "
+            if self._peer_nickname is None:
+                return prefix  # Lookup failed ('Unknown'): retry on the next message
+            self._peer_prefix = prefix
+        return self._peer_prefix
+
+    def forget_peer_nickname(self) -> None:
+        """
+        Drop the cached peer nickname, e.g. after the peer has been renamed.
+        """
+        self._peer_nickname = None
+        self._peer_prefix = None
+
+    # Protocol message tag -> handler, looked up once per received message
+    _CONTROL_HANDLERS = {
+        "__PING__": _handle_ping_pong,
+        "__PONG__": _handle_ping_pong,
+        "__FILE_TRANSFER_ACCEPTED__": _on_file_transfer_accepted,
+        "__FILE_TRANSFER__": _on_file_transfer_request,
+        "__FILE_ACCEPT__": lambda self, message: self._handle_file_transfer(message),
+        # Announcements of the file transfer protocol itself, handled by FileTransferMixin
+        # (its _handle_file_transfer is shadowed by the one above)
+        "__FILE_REQUEST__": FileTransferMixin._handle_file_transfer,
+        "__FILE_DECLINE__": FileTransferMixin._handle_file_transfer,
+        "__FILE_END__": FileTransferMixin._handle_file_transfer,
+        "__DISCONNECT__": _on_disconnect,
+    }
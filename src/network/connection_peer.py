@@ -1,9 +1,18 @@
 # Peer connection management mixin for P2PConnection
+import errno
+import ipaddress
+import os
+import select
+import selectors
 import socket
 import threading
+from typing import Tuple
 import socks
 from colorama import Fore, Style
-from datetime import datetime
+from src.core.utility_time import now_hms
+
+# connect_ex() results meaning that a non-blocking connection is under way
+_CONNECT_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK)}
 
 class PeerMixin:
     """
@@ -22,10 +31,11 @@ class PeerMixin:
         if self.connected:
             self.message_callback("Already connected to a peer")
             return False
-        if not self._validate_ip_address(peer_ip):
+        ip = self._parse_ip(peer_ip)
+        if ip is None:
             self.message_callback(f"Invalid IP address: {peer_ip}")
             return False
-        if self._is_private_ip(peer_ip):
+        if ip.is_private:
             self.message_callback(Fore.LIGHTYELLOW_EX + f"[INFO] Connecting to private IP: {peer_ip}" + Style.RESET_ALL)
         else:
             self.message_callback(Fore.LIGHTYELLOW_EX + f"[INFO] Connecting to public IP: {peer_ip}" + Style.RESET_ALL)
@@ -33,11 +43,10 @@ class PeerMixin:
         self._peer_connection_details = (peer_ip, peer_port)
         self._is_server_mode = False
         try:
-            self.message_callback(Fore.LIGHTYELLOW_EX + f"[{datetime.now().strftime('%H:%M:%S')}] Attempting to connect to {peer_ip}:{peer_port}..." + Style.RESET_ALL)
+            self.message_callback(Fore.LIGHTYELLOW_EX + f"[{now_hms()}] Attempting to connect to {peer_ip}:{peer_port}..." + Style.RESET_ALL)
             self.peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.peer_socket.settimeout(timeout)
-            self.peer_socket.connect((peer_ip, peer_port))
-            self.peer_socket.settimeout(None)
+            self._tune_peer_socket(self.peer_socket)
+            self._connect_with_timeout(self.peer_socket, (peer_ip, peer_port), timeout)
             if not self._exchange_handshake_data(
                 send_public_key_first=True,
                 peer_ip=peer_ip,
@@ -49,8 +58,6 @@ class PeerMixin:
             self._initialize_renewal_trackers()
             self._receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
             self._receive_thread.start()
-            self._renewal_thread = threading.Thread(target=self._renewal_monitor, daemon=True)
-            self._renewal_thread.start()
             return True
         except Exception as e:
             self.message_callback(f"Connection error: {str(e)}")
@@ -75,9 +82,11 @@ class PeerMixin:
         self._peer_connection_details = (onion_address, port)
         self._is_server_mode = False
         try:
-            self.message_callback(Fore.LIGHTYELLOW_EX + f"[{datetime.now().strftime('%H:%M:%S')}] Attempting to connect to {onion_address}:{port} via Tor..." + Style.RESET_ALL)
+            self.message_callback(Fore.LIGHTYELLOW_EX + f"[{now_hms()}] Attempting to connect to {onion_address}:{port} via Tor..." + Style.RESET_ALL)
             self.peer_socket = socks.socksocket()
             self.peer_socket.set_proxy(socks.SOCKS5, "127.0.0.1", 9050)
+            # Nagle would also delay small frames on the hop to the local Tor proxy
+            self._tune_peer_socket(self.peer_socket)
             self.peer_socket.settimeout(timeout)
             self.peer_socket.connect((onion_address, port))
             self.peer_socket.settimeout(None)
@@ -92,50 +101,111 @@ class PeerMixin:
             self._initialize_renewal_trackers()
             self._receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
             self._receive_thread.start()
-            self._renewal_thread = threading.Thread(target=self._renewal_monitor, daemon=True)
-            self._renewal_thread.start()
             return True
         except Exception as e:
             self.message_callback(f"Connection error: {str(e)}")
             self._close_peer_socket()
             return False
 
+    def _connect_with_timeout(self, sock: socket.socket, address: Tuple[str, int], timeout: float) -> None:
+        """
+        Connect a TCP socket with a non-blocking connect() and a single select() for the timeout.
+        The socket is left in blocking mode. (SOCKS sockets keep using settimeout(): the proxy
+        negotiation after connect() needs a blocking socket.)
+        Args:
+            sock: Socket to connect.
+            address: (host, port) to connect to.
+            timeout: Connection timeout in seconds.
+        Raises:
+            socket.timeout: If the connection is not established in time.
+            OSError: If the connection fails.
+        """
+        sock.setblocking(False)
+        err = sock.connect_ex(address)
+        if err in _CONNECT_IN_PROGRESS:
+            _, writable, _ = select.select([], [sock], [], timeout)
+            if not writable:
+                raise socket.timeout("timed out")
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise OSError(err, os.strerror(err))
+        sock.setblocking(True)
+
+    def _parse_ip(self, ip: str):
+        """
+        Parse an IP address once, for both validation and classification.
+        Args:
+            ip: IPv4 or IPv6 address string.
+        Returns:
+            ipaddress.IPv4Address / IPv6Address, or None if the string is not a valid address.
+        """
+        try:
+            return ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+
     def _accept_connections(self) -> None:
         """
         Thread for accepting incoming connections with authentication.
+        Blocks in a selector (epoll on Linux) until a connection is pending or
+        close_server() writes to the wake-up socket.
         """
-        while not self._stop_flag.is_set() and self._server_running:
-            try:
-                if not self.socket:
+        if not self.socket or not self._wake_r:
+            return
+        self.socket.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while not self._stop_flag.is_set() and self._server_running:
+                try:
+                    events = selector.select()
+                    if any(key.fileobj is self._wake_r for key, _ in events):
+                        break
+                    client_socket, address = self.socket.accept()
+                except BlockingIOError:
+                    continue  # The pending connection went away before accept()
+                except (OSError, ValueError) as e:
+                    # Listening socket closed by close_server()
+                    if self._server_running and not self._stop_flag.is_set():
+                        self.message_callback(f"Error accepting connection: {str(e)}")
                     break
-                self.socket.settimeout(1.0)
-                client_socket, address = self.socket.accept()
-                if self.connected:
-                    self.message_callback(f"Rejected incoming connection from {address}: Already connected.")
-                    client_socket.close()
-                    continue
-                self._stop_peer_connection()
-                self.peer_socket = client_socket
-                #self.peer_socket.settimeout(5)  # Timeout pour éviter blocage sur recv
-                self._peer_connection_details = address
-                self._is_server_mode = True
-                self.message_callback(Fore.LIGHTYELLOW_EX  + f"Incoming connection from {address} received." + Style.RESET_ALL)
-                if not self._exchange_handshake_data(
-                    send_public_key_first=False,
-                    peer_ip=address[0],
-                    peer_port=address[1]
-                ):
-                    self._close_peer_socket()
-                    continue
-                self.connected = True
-                self._initialize_renewal_trackers()
-                self._receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
-                self._receive_thread.start()
-                self._renewal_thread = threading.Thread(target=self._renewal_monitor, daemon=True)
-                self._renewal_thread.start()
-                self.message_callback(Fore.LIGHTGREEN_EX + f"Successfully connected to {address}" + Style.RESET_ALL)
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if not self._stop_flag.is_set():
-                    self.message_callback(f"Error accepting connection: {str(e)}") 
\ No newline at end of file
+                try:
+                    self._handle_incoming_connection(client_socket, address)
+                except Exception as e:
+                    if not self._stop_flag.is_set():
+                        self.message_callback(f"Error accepting connection: {str(e)}")
+        finally:
+            selector.close()
+
+    def _handle_incoming_connection(self, client_socket: socket.socket, address) -> None:
+        """
+        Authenticate an accepted connection and start the session if no peer is connected yet.
+        Args:
+            client_socket: Socket returned by accept().
+            address: Address of the remote peer.
+        """
+        if self.connected:
+            self.message_callback(f"Rejected incoming connection from {address}: Already connected.")
+            client_socket.close()
+            return
+        client_socket.setblocking(True)
+        self._tune_peer_socket(client_socket)
+        self._stop_peer_connection()
+        self.peer_socket = client_socket
+        #self.peer_socket.settimeout(5)  # Timeout pour éviter blocage sur recv
+        self._peer_connection_details = address
+        self._is_server_mode = True
+        self.message_callback(Fore.LIGHTYELLOW_EX  + f"Incoming connection from {address} received." + Style.RESET_ALL)
+        if not self._exchange_handshake_data(
+            send_public_key_first=False,
+            peer_ip=address[0],
+            peer_port=address[1]
+        ):
+            self._close_peer_socket()
+            return
+        self.connected = True
+        self._initialize_renewal_trackers()
+        self._receive_thread = threading.Thread(target=self._receive_messages, daemon=True)
+        self._receive_thread.start()
+        self.message_callback(Fore.LIGHTGREEN_EX + f"Successfully connected to {address}" + Style.RESET_ALL)
@@ -115,6 +115,8 @@ def handle_rename_command(console_ui, parts):
     fingerprint = parts[1]
     new_name = parts[2]
     console_ui.hosts_manager.set_nickname(fingerprint, new_name)
+    if console_ui.connection:
+        console_ui.connection.forget_peer_nickname()
     print(f"Nickname updated for {fingerprint}")
 
 def handle_addhost_command(console_ui, parts):
@@ -149,6 +151,8 @@ def handle_exit_command(console_ui):
             pass
     if console_ui.connection:
         console_ui.connection.stop()
+    # Write trust-store changes still waiting for their delayed save
+    console_ui.hosts_manager._flush_if_dirty()
 
 def handle_send_file_command(console_ui, parts):
     if len(parts) != 2:
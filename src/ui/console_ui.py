@@ -6,9 +6,9 @@ Handles user input, command processing, and message display.
 import threading
 import sys
 from typing import Optional, List
-from datetime import datetime
 from colorama import Fore, Style
 from src.core import file_transfer
+from src.core.utility_time import now_hms
 
 
 try:
@@ -47,7 +47,7 @@ class ConsoleUI:
     def __init__(self):
         """Initialize the console UI."""
         self.connection: Optional[P2PConnection] = None
-        self.hosts_manager = KnownHostsManager()
+        self.hosts_manager = KnownHostsManager.get()
         self._stop_flag = threading.Event()
         self.history: List[str] = []
         self._multiline_mode = False
@@ -89,8 +89,6 @@ class ConsoleUI:
         Callback to display received messages with timestamp and save in history.
         Also handles file transfer protocol.
         """
-        now = datetime.now().strftime("%H:%M:%S")
-        
         # Detection of file transfer request message
         info_msg = file_transfer.handle_file_transfer_request(message)
         self.connection.activate_file_receiving_mode()
@@ -341,9 +339,10 @@ class ConsoleUI:
             return
             
         try:
-            print(Fore.LIGHTBLUE_EX + f"[ You | {datetime.now().strftime('%H:%M:%S')} ]" + Style.RESET_ALL + f"{message}")
+            timestamp = now_hms()
+            print(Fore.LIGHTBLUE_EX + f"[ You | {timestamp} ]" + Style.RESET_ALL + f"{message}")
             self.connection.send_message(message)
-            self.history.append(f"[ You | {datetime.now().strftime('%H:%M:%S')} ] {message}")
+            self.history.append(f"[ You | {timestamp} ] {message}")
         except Exception as e:
             print(f"Error sending message: {str(e)}")
         
@@ -51,4 +51,16 @@ def test_close_server_sets_flag_and_closes_socket(base_conn):
     base_conn._accept_thread.is_alive.return_value = False
     base_conn.close_server()
     assert not base_conn._server_running
-    mock_socket.close.assert_called_once() 
\ No newline at end of file
+    mock_socket.close.assert_called_once() 
+
+def test_close_server_wakes_accept_thread(dummy_callback):
+    import time
+    from src.network.connection import P2PConnection as FullConnection
+    conn = FullConnection(0, dummy_callback)
+    conn.start_server()
+    assert conn._server_running
+    start = time.monotonic()
+    conn.close_server()
+    assert not conn._accept_thread.is_alive()
+    assert time.monotonic() - start < 1
+    assert conn._wake_r is None and conn.socket is None
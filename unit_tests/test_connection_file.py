@@ -10,6 +10,9 @@ class DummyFileTransfer(FileTransferMixin):
         self._pending_file_path = None
     def _send_raw(self, data):
         pass
+    def _send_raw_batch(self, frames):
+        for data in frames:
+            self._send_raw(data)
     def _receive_raw(self):
         return b''
 
@@ -20,7 +23,78 @@ def test_send_file_not_found(tmp_path):
 
 def test_handle_file_request():
     obj = DummyFileTransfer()
-    msg = "__FILE_REQUEST__{'file_name': 'test.txt', 'file_size': 123}"
+    msg = '__FILE_REQUEST__123:test.txt'
     handled = obj._handle_file_transfer(msg)
     assert handled
-    obj.message_callback.assert_any_call('Peer wants to send you a file: test.txt (123 bytes)') 
\ No newline at end of file
+    obj.message_callback.assert_any_call('Peer wants to send you a file: test.txt (123 bytes)') 
+
+def test_handle_malformed_file_request():
+    obj = DummyFileTransfer()
+    assert obj._handle_file_transfer("__FILE_REQUEST__abc:test.txt")
+    obj.message_callback.assert_called_with("> [ERROR] Invalid file request.")
+
+def test_send_file_data_reuses_chunk_buffer(tmp_path):
+    obj = DummyFileTransfer()
+    obj._send_buf = bytearray(4)
+    sent = []
+    obj.crypto.encrypt_bytes.side_effect = lambda chunk: bytes(chunk)
+    obj.crypto.encrypt_message.side_effect = lambda message: message.encode()
+    obj._send_raw = sent.append
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'0123456789')
+    obj.send_file_data(str(path))
+    assert sent == [b'0123', b'4567', b'89', b'__FILE_END__']
+
+def test_send_file_request_roundtrip(tmp_path):
+    sender, receiver = DummyFileTransfer(), DummyFileTransfer()
+    path = tmp_path / 'a b:c.txt'
+    path.write_bytes(b'x' * 42)
+    sender.send_file(str(path))
+    receiver._handle_file_transfer(sender.send_message.call_args[0][0])
+    receiver.message_callback.assert_any_call('Peer wants to send you a file: a b:c.txt (42 bytes)')
+
+def test_handle_file_transfer_tags():
+    obj = DummyFileTransfer()
+    assert obj._handle_file_transfer("__FILE_DECLINE__")
+    obj.message_callback.assert_called_with("Peer declined the file transfer.")
+    assert obj._handle_file_transfer("__FILE_END__")
+    obj.message_callback.assert_called_with("File transfer completed.")
+    assert not obj._handle_file_transfer("__FILE_TRANSFER__ a.txt 12")
+    assert not obj._handle_file_transfer("hello")
+
+def test_send_file_data_batches_chunks(tmp_path):
+    obj = DummyFileTransfer()
+    obj._send_buf = bytearray(4)
+    obj.SEND_BATCH_SIZE = 8
+    batches = []
+    progress = []
+    obj.crypto.encrypt_bytes.side_effect = lambda chunk: bytes(chunk)
+    obj.crypto.encrypt_message.side_effect = lambda message: message.encode()
+    obj._send_raw_batch = lambda frames: batches.append(list(frames))
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'0123456789')
+    obj.send_file_data(str(path), callback=progress.append)
+    assert batches == [[b'0123', b'4567'], [b'89', b'__FILE_END__']]
+    assert progress == [0.8, 1.0]
+
+def test_send_file_data_reports_read_errors(tmp_path):
+    obj = DummyFileTransfer()
+    obj._send_buf = bytearray(4)
+    obj.crypto.encrypt_bytes.side_effect = ValueError("boom")
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'0123456789')
+    obj.send_file_data(str(path))
+    obj.message_callback.assert_called_with("Error sending file: boom")
+    obj.crypto.encrypt_message.assert_not_called()
+
+def test_send_file_data_stops_reader_on_send_error(tmp_path):
+    obj = DummyFileTransfer()
+    obj._send_buf = bytearray(1)
+    obj.FILE_CHUNK_SIZE = obj.SEND_BATCH_SIZE = 1
+    obj.crypto.encrypt_bytes.side_effect = lambda chunk: bytes(chunk)
+    obj._send_raw_batch = MagicMock(side_effect=OSError("broken pipe"))
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'x' * 100)
+    obj.send_file_data(str(path))
+    obj.message_callback.assert_called_with("Error sending file: broken pipe")
+    obj._send_raw_batch.assert_called_once()
@@ -1,10 +1,10 @@
 import pytest
 from src.network.connection_handshake import HandshakeMixin
-from datetime import datetime, timedelta
+import time
 
 class DummyHandshake(HandshakeMixin):
     def __init__(self):
-        self._last_renewal_time = datetime.now() - timedelta(minutes=61)
+        self._last_renewal_time = time.monotonic() - 61 * 60
         self._message_count = 10001
         self.RENEW_AFTER_MESSAGES = 10000
         self.RENEW_AFTER_MINUTES = 60
@@ -19,4 +19,85 @@ def test_is_onion_address():
 
 def test_should_renew_connection():
     obj = DummyHandshake()
-    assert obj._should_renew_connection() 
\ No newline at end of file
+    assert obj._should_renew_connection() 
+
+def test_pack_unpack_fields():
+    from src.network.connection_handshake import _pack_fields, _unpack_fields
+    record = _pack_fields(b'key', b'', b'\x00' * 300)
+    assert _unpack_fields(record, 3) == [b'key', b'', b'\x00' * 300]
+    with pytest.raises(ValueError):
+        _unpack_fields(record[:-1], 3)
+    with pytest.raises(ValueError):
+        _unpack_fields(record, 2)
+
+def test_binary_handshake_roundtrip(tmp_path):
+    import socket
+    import threading
+    from unittest.mock import MagicMock
+    from src.core.crypto import CryptoManager
+    from src.network.connection_io import IOMixin
+
+    class Peer(HandshakeMixin, IOMixin):
+        def __init__(self, sock, keyfile):
+            self.peer_socket = sock
+            self.crypto = CryptoManager(keyfile)
+            self.message_callback = MagicMock()
+
+    a, b = socket.socketpair()
+    client = Peer(a, str(tmp_path / 'client.pem'))
+    server = Peer(b, str(tmp_path / 'server.pem'))
+    results = {}
+    t = threading.Thread(target=lambda: results.setdefault('server', server._exchange_handshake_data(False)))
+    t.start()
+    try:
+        assert client._exchange_handshake_data(True)
+        t.join(timeout=5)
+        assert results['server']
+        assert client.crypto.get_peer_fingerprint() == server.crypto.get_public_key_fingerprint()
+        assert server.crypto.decrypt_message(client.crypto.encrypt_message('hi')) == 'hi'
+    finally:
+        a.close()
+        b.close()
+
+def test_handshake_rejects_bad_signature(tmp_path):
+    import socket
+    import threading
+    from unittest.mock import MagicMock
+    from src.core.crypto import CryptoManager
+    from src.network.connection_io import IOMixin
+
+    class Peer(HandshakeMixin, IOMixin):
+        def __init__(self, sock, keyfile):
+            self.peer_socket = sock
+            self.crypto = CryptoManager(keyfile)
+            self.message_callback = MagicMock()
+
+    a, b = socket.socketpair()
+    client = Peer(a, str(tmp_path / 'client.pem'))
+    server = Peer(b, str(tmp_path / 'server.pem'))
+    server.crypto.sign_challenge = lambda challenge: b'forged'
+    results = {}
+    t = threading.Thread(target=lambda: results.setdefault('server', server._exchange_handshake_data(False)))
+    t.start()
+    try:
+        assert not client._exchange_handshake_data(True)
+        client.message_callback.assert_called_with("Peer authentication failed: Invalid signature")
+        # Nothing from the unauthenticated peer is installed
+        assert client.crypto.peer_public_key is None and client.crypto.session_key is None
+        a.close()
+        t.join(timeout=5)
+        assert results['server'] is False
+    finally:
+        a.close()
+        b.close()
+
+def test_renewal_timer_triggers_reconnection():
+    import threading
+    obj = DummyHandshake()
+    obj.RENEW_AFTER_MINUTES = 0.001
+    obj._renewal_timer = None
+    fired = threading.Event()
+    obj._trigger_reconnection = fired.set
+    obj._initialize_renewal_trackers()
+    assert obj._message_count == 0
+    assert fired.wait(timeout=2)
@@ -12,4 +12,71 @@ def test_send_raw_no_socket():
 
 def test_receive_raw_no_socket():
     obj = DummyIO()
-    assert obj._receive_raw() == b'' 
\ No newline at end of file
+    assert obj._receive_raw() == b'' 
+
+def test_send_receive_raw_roundtrip():
+    import socket
+    a, b = socket.socketpair()
+    sender, receiver = DummyIO(), DummyIO()
+    sender.peer_socket, receiver.peer_socket = a, b
+    try:
+        sender._send_raw(b'hello')
+        assert b.recv(7, socket.MSG_PEEK | socket.MSG_WAITALL) == b'\x00\x05hello'
+        assert receiver._receive_raw() == b'hello'
+    finally:
+        a.close()
+        b.close()
+
+def test_receive_raw_truncated_frame():
+    import socket
+    a, b = socket.socketpair()
+    receiver = DummyIO()
+    receiver.peer_socket = b
+    try:
+        a.sendall((10).to_bytes(2, 'big') + b'abc')
+        a.close()
+        assert receiver._receive_raw() == b''
+    finally:
+        b.close()
+
+def test_tune_peer_socket():
+    import socket
+    obj = DummyIO()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        obj._tune_peer_socket(sock)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+    finally:
+        sock.close()
+
+def test_send_raw_batch_resumes_partial_writes():
+    class TrickleSocket:
+        def __init__(self):
+            self.out = bytearray()
+        def sendmsg(self, buffers):
+            data = b''.join(bytes(b) for b in buffers)[:3]
+            self.out += data
+            return len(data)
+    obj = DummyIO()
+    obj.peer_socket = TrickleSocket()
+    obj._send_raw_batch([b'hello', b'', b'world!'])
+    assert bytes(obj.peer_socket.out) == (
+        b'\x00\x05hello' + b'\x00\x00' + b'\x00\x06world!')
+
+def test_send_receive_raw_long_frame():
+    import socket
+    import threading
+    a, b = socket.socketpair()
+    sender, receiver = DummyIO(), DummyIO()
+    sender.peer_socket, receiver.peer_socket = a, b
+    payload = bytes(range(256)) * 256  # 64 KiB, needs the 4-byte header
+    try:
+        t = threading.Thread(target=sender._send_raw, args=(payload,))
+        t.start()
+        assert receiver._receive_raw() == payload
+        t.join()
+        assert sender._frame_header(len(payload)) == b'\x80\x01\x00\x00'
+    finally:
+        a.close()
+        b.close()
@@ -1,3 +1,4 @@
+import itertools
 import pytest
 from unittest.mock import MagicMock
 from src.network.connection_message import MessageMixin
@@ -7,8 +8,8 @@ class DummyMessage(MessageMixin):
         self.connected = False
         self.peer_socket = None
         self.crypto = MagicMock()
-        self._ping_lock = MagicMock()
         self._ping_responses = {}
+        self._ping_counter = itertools.count(1)
         self.message_callback = MagicMock()
         self.send_message = MagicMock()
     def _send_raw(self, data):
@@ -22,10 +23,179 @@ def test_handle_ping():
 
 def test_handle_pong():
     obj = DummyMessage()
-    obj._ping_responses = {"1234": None}
+    obj._ping_responses = {1234: None}
     handled = obj._handle_ping_pong("__PONG__1234")
     assert handled
+    assert obj._ping_responses == {}
+    assert obj._handle_ping_pong("__PONG__junk")
 
 def test_send_message_not_connected():
     obj = DummyMessage()
-    obj.send_message("hello")  # Doit ne rien faire (pas d'exception) 
\ No newline at end of file
+    obj.send_message("hello")  # Doit ne rien faire (pas d'exception) 
+def test_ping_peer_wakes_on_pong():
+    import threading
+    obj = DummyMessage()
+    obj.connected = True
+    def answer(message):
+        pong = message.replace("__PING__", "__PONG__")
+        threading.Timer(0.05, obj._handle_ping_pong, args=(pong,)).start()
+    obj.send_message = answer
+    rtt = obj.ping_peer(timeout=2)
+    assert rtt is not None and 0.04 <= rtt < 1
+    assert obj._ping_responses == {}
+
+def test_ping_peer_timeout():
+    obj = DummyMessage()
+    obj.connected = True
+    assert obj.ping_peer(timeout=0.05) is None
+    assert obj._ping_responses == {}
+
+def test_ping_peer_async():
+    import asyncio
+    import threading
+    obj = DummyMessage()
+    obj.connected = True
+    def answer(message):
+        pong = message.replace("__PING__", "__PONG__")
+        threading.Timer(0.05, obj._handle_ping_pong, args=(pong,)).start()
+    obj.send_message = answer
+    rtt = asyncio.run(obj.ping_peer_async(timeout=2))
+    assert rtt is not None and 0.04 <= rtt < 1
+    obj.send_message = MagicMock()
+    assert asyncio.run(obj.ping_peer_async(timeout=0.05)) is None
+    assert obj._ping_responses == {}
+
+def test_ping_ids_are_sequential():
+    obj = DummyMessage()
+    obj.connected = True
+    obj.ping_peer(timeout=0)
+    obj.ping_peer(timeout=0)
+    sent = [call.args[0] for call in obj.send_message.call_args_list]
+    assert sent == ["__PING__1", "__PING__2"]
+
+def test_handle_control_message_dispatch():
+    obj = DummyMessage()
+    obj._file_receive_info = None
+    assert obj._handle_control_message("__PING__7")
+    obj.send_message.assert_called_with("__PONG__7")
+    assert not obj._handle_control_message("hello __PING__")
+    assert not obj._handle_control_message("__not a tag")
+    # Sender side: the acceptance is left to the UI, which starts sending the file
+    assert not obj._handle_control_message("__FILE_TRANSFER_ACCEPTED__")
+
+def test_peer_nickname_is_cached_until_forgotten():
+    obj = DummyMessage()
+    obj._peer_nickname = None
+    obj.crypto.get_peer_fingerprint.return_value = 'ab' * 32
+    obj.hosts_manager = MagicMock()
+    obj.hosts_manager.get_nickname.return_value = 'alice'
+    assert obj._get_peer_nickname() == 'alice'
+    assert obj._get_peer_nickname() == 'alice'
+    obj.hosts_manager.get_nickname.assert_called_once()
+    obj.hosts_manager.get_nickname.return_value = None
+    obj.forget_peer_nickname()
+    assert obj._get_peer_nickname() == 'abababab'
+
+def test_peer_message_prefix_is_cached():
+    obj = DummyMessage()
+    obj._peer_nickname = None
+    obj._peer_prefix = None
+    obj.crypto.get_peer_fingerprint.return_value = 'ab' * 32
+    obj.hosts_manager = MagicMock()
+    obj.hosts_manager.get_nickname.return_value = 'alice'
+    prefix = obj._peer_message_prefix()
+    assert prefix.endswith('[ alice  |  ')
+    assert obj._peer_message_prefix() is prefix
+    obj.forget_peer_nickname()
+    obj.hosts_manager.get_nickname.return_value = 'bob'
+    assert obj._peer_message_prefix().endswith('[ bob  |  ')
+
+def test_file_protocol_messages_are_not_shown_as_chat():
+    obj = DummyMessage()
+    assert obj._handle_control_message("__FILE_END__")
+    obj.message_callback.assert_called_with("File transfer completed.")
+    assert obj._handle_control_message("__FILE_REQUEST__12:a.txt")
+    obj.message_callback.assert_called_with("Peer wants to send you a file: a.txt (12 bytes)")
+
+def test_file_transfer_request_defers_destination(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    obj = DummyMessage()
+    obj._file_receive_info = None
+    assert obj._handle_control_message("__FILE_TRANSFER__notes.txt 42")
+    info = obj._file_receive_info
+    assert (info['name'], info['size'], info['received']) == ('notes.txt', 42, 0)
+    # Nothing is created on disk before the transfer is accepted
+    assert info['file_obj'] is None
+    assert not (tmp_path / 'received_files').exists()
+
+def test_receive_file_chunk_writes_preallocated_file(tmp_path, monkeypatch):
+    import os
+    import src.core.file_transfer as file_transfer
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_transfer, 'FILE_TRANSFER_BOOL', True)
+    obj = DummyMessage()
+    obj._handle_control_message("__FILE_TRANSFER__data.bin 6")
+    obj._receiving_file = True
+    obj._recv_buf = obj._plain_buf = bytearray(8)
+    obj._receive_raw_into = lambda buf: memoryview(b'frame')
+    path = tmp_path / 'received_files' / 'data.bin'
+    obj.crypto.decrypt_bytes_into.return_value = memoryview(b'abc')
+    assert obj._receive_file_chunk()
+    # The first chunk creates the file; posix_fallocate reserves the full size where supported
+    if hasattr(os, 'posix_fallocate'):
+        assert path.stat().st_size == 6
+    obj.crypto.decrypt_bytes_into.return_value = memoryview(b'def')
+    assert obj._receive_file_chunk()
+    assert not obj._receiving_file and obj._file_receive_info is None
+    assert path.read_bytes() == b'abcdef'
+
+def test_receive_file_chunk_truncates_on_decline(tmp_path, monkeypatch):
+    import src.core.file_transfer as file_transfer
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_transfer, 'FILE_TRANSFER_BOOL', True)
+    obj = DummyMessage()
+    obj._handle_control_message("__FILE_TRANSFER__data.bin 6")
+    obj._receiving_file = True
+    obj._recv_buf = obj._plain_buf = bytearray(8)
+    obj._receive_raw_into = lambda buf: memoryview(b'frame')
+    obj.crypto.decrypt_bytes_into.return_value = memoryview(b'abc')
+    assert obj._receive_file_chunk()
+    file_obj = obj._file_receive_info['file_obj']
+    monkeypatch.setattr(file_transfer, 'FILE_TRANSFER_BOOL', False)
+    assert obj._receive_file_chunk()
+    assert file_obj.closed and obj._file_receive_info is None
+    assert (tmp_path / 'received_files' / 'data.bin').read_bytes() == b'abc'
+
+def test_receive_file_chunk_truncates_on_lost_connection(tmp_path, monkeypatch):
+    import src.core.file_transfer as file_transfer
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_transfer, 'FILE_TRANSFER_BOOL', True)
+    obj = DummyMessage()
+    obj.stop = MagicMock()
+    obj._handle_control_message("__FILE_TRANSFER__data.bin 6")
+    obj._receiving_file = True
+    obj._recv_buf = obj._plain_buf = bytearray(8)
+    obj._receive_raw_into = lambda buf: memoryview(b'frame')
+    obj.crypto.decrypt_bytes_into.return_value = memoryview(b'abc')
+    assert obj._receive_file_chunk()
+    obj._receive_raw_into = lambda buf: memoryview(b'')
+    assert not obj._receive_file_chunk()
+    assert (tmp_path / 'received_files' / 'data.bin').read_bytes() == b'abc'
+
+def test_receive_text_message_displays_chat():
+    obj = DummyMessage()
+    obj._receive_raw = lambda: b'frame'
+    obj.crypto.decrypt_message.return_value = "hello"
+    obj._message_count = 0
+    obj._peer_prefix = "[ peer  |  "
+    obj._should_renew_connection = lambda: False
+    assert obj._receive_text_message()
+    assert obj._message_count == 1
+    assert obj.message_callback.call_args[0][0].endswith("hello")
+
+def test_receive_text_message_stops_on_closed_connection():
+    obj = DummyMessage()
+    obj._receive_raw = lambda: b''
+    obj.stop = MagicMock()
+    assert not obj._receive_text_message()
+    obj.stop.assert_called_once()
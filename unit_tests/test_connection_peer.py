@@ -15,12 +15,13 @@ class DummyPeer(PeerMixin):
         self.crypto = MagicMock()
         self._initialize_renewal_trackers = MagicMock()
         self._receive_thread = None
-        self._renewal_thread = None
+        self._renewal_timer = None
         self.peer_socket = MagicMock()
         self.socket = MagicMock()
         self._stop_flag = MagicMock()
         self._server_running = False
         self._close_peer_socket = MagicMock()
+        self._tune_peer_socket = MagicMock()
 
 
 def test_connect_to_peer_already_connected():
@@ -60,4 +61,64 @@ def test_connect_to_peer_private_ip():
                 result = None
             print('connect_to_peer result:', result)
             obj.message_callback.assert_any_call(ANY)
-            assert result is True 
\ No newline at end of file
+            assert result is True 
+
+def test_accept_connections_hands_off_incoming_socket():
+    import socket
+    import threading
+    import time
+    obj = DummyPeer()
+    obj._stop_flag = threading.Event()
+    obj._server_running = True
+    obj._exchange_handshake_data = MagicMock(return_value=False)
+    obj.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    obj.socket.bind(('127.0.0.1', 0))
+    obj.socket.listen(1)
+    obj._wake_r, wake_w = socket.socketpair()
+    t = threading.Thread(target=obj._accept_connections, daemon=True)
+    t.start()
+    client = socket.create_connection(obj.socket.getsockname())
+    try:
+        deadline = time.monotonic() + 5
+        while not obj._exchange_handshake_data.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        obj._exchange_handshake_data.assert_called_once()
+        obj._close_peer_socket.assert_called_once()
+    finally:
+        obj._server_running = False
+        wake_w.send(b'x')
+        t.join(timeout=5)
+        obj.socket.close()
+        obj._wake_r.close()
+        wake_w.close()
+        client.close()
+    assert not t.is_alive()
+
+def test_parse_ip():
+    obj = DummyPeer()
+    assert obj._parse_ip('192.168.1.1').is_private
+    assert not obj._parse_ip('8.8.8.8').is_private
+    assert obj._parse_ip('999.1.1.1') is None
+    assert obj._parse_ip('bad_ip') is None
+
+def test_connect_with_timeout():
+    import socket
+    obj = DummyPeer()
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    address = server.getsockname()
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        obj._connect_with_timeout(client, address, 5)
+        assert client.getblocking()
+        assert client.getpeername() == address
+    finally:
+        client.close()
+        server.close()
+    refused = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        with pytest.raises(ConnectionRefusedError):
+            obj._connect_with_timeout(refused, address, 5)
+    finally:
+        refused.close()
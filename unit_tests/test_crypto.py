@@ -34,6 +34,8 @@ def test_encrypt_decrypt_message_bytes(monkeypatch):
     cm2 = CryptoManager()
     cm1.set_peer_public_key(cm2.get_public_bytes())
     cm2.set_peer_public_key(cm1.get_public_bytes())
+    cm1.establish_session(b'c1', b'c2', initiator=True)
+    cm2.establish_session(b'c2', b'c1', initiator=False)
     msg = 'hello world'
     encrypted = cm1.encrypt_message(msg)
     decrypted = cm2.decrypt_message(encrypted)
@@ -41,4 +43,60 @@ def test_encrypt_decrypt_message_bytes(monkeypatch):
     data = b'\x01\x02\x03abc'
     encrypted_bytes = cm1.encrypt_bytes(data)
     decrypted_bytes = cm2.decrypt_bytes(encrypted_bytes)
-    assert decrypted_bytes == data 
\ No newline at end of file
+    assert decrypted_bytes == data 
+
+def test_nonces_are_unique_per_session():
+    cm1 = CryptoManager()
+    cm2 = CryptoManager()
+    cm1.set_peer_public_key(cm2.get_public_bytes())
+    cm2.set_peer_public_key(cm1.get_public_bytes())
+    cm1.establish_session(b'c1', b'c2', initiator=True)
+    cm2.establish_session(b'c2', b'c1', initiator=False)
+    for sender in (cm1, cm2):
+        counters = [int.from_bytes(sender.encrypt_bytes(b'data')[:12], 'big') for _ in range(3)]
+        assert counters == [0, 1, 2]
+    cm1.establish_session(b'c3', b'c4', initiator=True)
+    assert int.from_bytes(cm1.encrypt_bytes(b'data')[:12], 'big') == 0
+
+def test_decrypt_bytes_into_reuses_buffer():
+    cm1 = CryptoManager()
+    cm2 = CryptoManager()
+    cm1.set_peer_public_key(cm2.get_public_bytes())
+    cm2.set_peer_public_key(cm1.get_public_bytes())
+    cm1.establish_session(b'c1', b'c2', initiator=True)
+    cm2.establish_session(b'c2', b'c1', initiator=False)
+    buf = bytearray(16)
+    plain = cm2.decrypt_bytes_into(cm1.encrypt_bytes(b'chunk'), buf)
+    assert plain.obj is buf and bytes(plain) == b'chunk'
+    # A chunk larger than the buffer still decrypts, into a fresh object
+    big = b'x' * 64
+    assert bytes(cm2.decrypt_bytes_into(cm1.encrypt_bytes(big), buf)) == big
+
+def test_session_keys_differ_per_session_and_direction():
+    from cryptography.exceptions import InvalidTag
+    cm1 = CryptoManager()
+    cm2 = CryptoManager()
+    cm1.set_peer_public_key(cm2.get_public_bytes())
+    cm2.set_peer_public_key(cm1.get_public_bytes())
+    cm1.establish_session(b'a1', b'a2', initiator=True)
+    first_session = cm1.session_key
+    # A frame sent in one direction does not decrypt as the other direction
+    with pytest.raises(InvalidTag):
+        cm1.decrypt_bytes(cm1.encrypt_bytes(b'data'))
+    cm1.establish_session(b'b1', b'b2', initiator=True)
+    assert cm1.session_key != first_session
+
+def test_nonces_are_unique_across_threads():
+    import threading
+    cm1 = CryptoManager()
+    cm1.set_peer_public_key(CryptoManager().get_public_bytes())
+    cm1.establish_session(b'c1', b'c2', initiator=True)
+    nonces = []
+    def worker():
+        nonces.extend([cm1._next_nonce() for _ in range(2000)])
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(nonces)) == len(nonces) == 16000
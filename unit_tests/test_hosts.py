@@ -16,6 +16,7 @@ def test_add_and_remove_host(tmp_path):
     assert mgr.get_host_fingerprint(addr) == fp
     assert mgr.remove_host(addr)
     assert mgr.get_host_fingerprint(addr) is None
+    assert not mgr.remove_host(addr)
 
 def test_set_and_get_nickname(tmp_path):
     hosts_file = tmp_path / 'hosts.json'
@@ -34,4 +35,97 @@ def test_validate_ip_and_onion_address():
     assert mgr._validate_ip_address('1.2.3.4:1234')
     assert not mgr._validate_ip_address('1.2.3.4')
     assert mgr._validate_onion_address('abc.onion:1234')
-    assert not mgr._validate_onion_address('abc.com:1234') 
\ No newline at end of file
+    assert not mgr._validate_onion_address('abc.com:1234') 
+def test_addresses_by_fingerprint(tmp_path):
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    fp = 'c'*64
+    mgr.add_host('1.2.3.4:1234', fp)
+    mgr.add_host('abc.onion:1234', fp)
+    assert mgr.is_known_fingerprint(fp)
+    assert mgr.get_addresses_by_fingerprint(fp) == ['1.2.3.4:1234', 'abc.onion:1234']
+    mgr.remove_host('1.2.3.4:1234')
+    assert mgr.get_addresses_by_fingerprint(fp) == ['abc.onion:1234']
+    mgr.remove_host('abc.onion:1234')
+    assert not mgr.is_known_fingerprint(fp)
+
+def test_readding_host_moves_it_to_new_fingerprint(tmp_path):
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    old_fp, new_fp = '1'*64, '2'*64
+    mgr.add_host('1.2.3.4:1234', old_fp)
+    mgr.add_host('1.2.3.4:1234', old_fp)
+    assert mgr.get_addresses_by_fingerprint(old_fp) == ['1.2.3.4:1234']
+    mgr.add_host('1.2.3.4:1234', new_fp)
+    assert not mgr.is_known_fingerprint(old_fp)
+    assert mgr.get_addresses_by_fingerprint(new_fp) == ['1.2.3.4:1234']
+
+def test_writes_are_batched_until_flush(tmp_path):
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    fp = 'd'*64
+    mgr.add_host('1.2.3.4:1234', fp)  # First change is written immediately
+    mgr.set_nickname(fp, 'dave')      # Within SAVE_INTERVAL: kept pending
+    assert KnownHostsManager(str(hosts_file)).get_nickname(fp) is None
+    mgr.flush()
+    assert KnownHostsManager(str(hosts_file)).get_nickname(fp) == 'dave'
+
+def test_lookup_by_nickname_and_onion(tmp_path):
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    fp = 'f'*64
+    mgr.add_host('1.2.3.4:1234', fp)
+    mgr.add_host('abc.onion:1234', fp)
+    mgr.set_nickname(fp, 'frank')
+    assert mgr.get_fingerprint_by_nickname('frank') == fp
+    assert mgr.get_onion_by_fingerprint(fp) == 'abc.onion:1234'
+    mgr.set_nickname(fp, 'franky')
+    assert mgr.get_fingerprint_by_nickname('frank') is None
+    assert mgr.get_fingerprint_by_nickname('franky') == fp
+
+def test_nickname_collisions_keep_first_registered(tmp_path):
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    fp1, fp2, fp3 = '1'*64, '2'*64, '3'*64
+    mgr.set_nickname(fp1, 'alice')
+    mgr.set_nickname(fp2, 'alice')
+    mgr.set_nickname(fp3, 'carol')
+    assert mgr.get_fingerprint_by_nickname('alice') == fp1
+    mgr.set_nickname(fp1, 'carol')  # alice passes to fp2; fp1 was registered before fp3
+    assert mgr.get_fingerprint_by_nickname('alice') == fp2
+    assert mgr.get_fingerprint_by_nickname('carol') == fp1
+    mgr.set_nickname(fp2, 'bob')
+    assert mgr.get_fingerprint_by_nickname('alice') is None
+    expected = dict(mgr._fp_by_nickname)
+    mgr._index_nicknames()
+    assert mgr._fp_by_nickname == expected
+
+def test_validate_ip_address_octets_and_ipv6(tmp_path):
+    mgr = KnownHostsManager(str(tmp_path / 'hosts.json'))
+    assert not mgr._validate_ip_address('999.999.999.999:80')
+    assert mgr._validate_ip_address('[::1]:80')
+    assert not mgr._validate_ip_address('::1:80')
+
+def test_deferred_change_is_written_by_timer(tmp_path):
+    import time
+    hosts_file = tmp_path / 'hosts.json'
+    mgr = KnownHostsManager(str(hosts_file))
+    mgr.SAVE_INTERVAL = 0.1
+    fp = 'e'*64
+    mgr.add_host('1.2.3.4:1234', fp)
+    mgr.set_nickname(fp, 'erin')      # Deferred, written by the trailing timer
+    time.sleep(0.3)
+    assert KnownHostsManager(str(hosts_file)).get_nickname(fp) == 'erin'
+
+def test_get_returns_shared_instance(tmp_path):
+    hosts_file = str(tmp_path / 'hosts.json')
+    mgr = KnownHostsManager.get(hosts_file)
+    assert KnownHostsManager.get(hosts_file) is mgr
+    assert KnownHostsManager.get(str(tmp_path / 'other.json')) is not mgr
+
+def test_validate_fingerprint_rejects_bad_length_and_whitespace(tmp_path):
+    mgr = KnownHostsManager(str(tmp_path / 'hosts.json'))
+    assert mgr._validate_fingerprint('a'*64)
+    assert not mgr._validate_fingerprint('a'*10)
+    assert not mgr._validate_fingerprint('a'*66)
+    assert not mgr._validate_fingerprint('aa '*21 + 'a')
@@ -0,0 +1,44 @@
+import numpy as np
+from unittest.mock import MagicMock
+from src.core import utility_sound
+
+def test_generate_wave_matches_np_sin():
+    duration, volume, samplerate = 0.2, 0.7, 5000
+    for frequency in (700, 900, 1100):
+        t = np.linspace(0., duration, int(samplerate * duration), endpoint=False)
+        expected = volume * np.sin(2. * np.pi * frequency * t)
+        wave = utility_sound._generate_wave(frequency, duration, volume, samplerate)
+        assert wave.shape == expected.shape
+        assert np.max(np.abs(wave - expected)) < 0.01  # Lookup-table resolution
+
+def test_generate_wave_is_cached_and_read_only():
+    first = utility_sound._generate_wave(700, 0.2, 0.7, 5000)
+    assert utility_sound._generate_wave(700, 0.2, 0.7, 5000) is first
+    assert not first.flags.writeable
+
+def test_render_melody_inserts_rests():
+    full = utility_sound._render_melody((700, 0, 700), 0.2, 0.7, 5000)
+    n = 1000
+    assert full.shape == (3 * n,)
+    assert not full[n:2 * n].any()
+    assert np.array_equal(full[:n], full[2 * n:])
+
+def test_play_notes_is_skipped_without_audio_output(monkeypatch):
+    thread = MagicMock()
+    monkeypatch.setattr(utility_sound, 'sd', None)
+    monkeypatch.setattr(utility_sound.threading, 'Thread', thread)
+    utility_sound.play_incoming_call_sound()
+    thread.assert_not_called()
+
+def test_play_notes_plays_rendered_melody(monkeypatch):
+    class InlineThread:
+        def __init__(self, target, args, daemon):
+            self.target, self.args = target, args
+        def start(self):
+            self.target(*self.args)
+    sd = MagicMock()
+    monkeypatch.setattr(utility_sound, 'sd', sd)
+    monkeypatch.setattr(utility_sound.threading, 'Thread', InlineThread)
+    utility_sound.play_notes([700, 0], duration=0.2, volume=0.7, samplerate=5000)
+    played, samplerate = sd.play.call_args[0]
+    assert samplerate == 5000 and played.shape == (2000,)
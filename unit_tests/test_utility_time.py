@@ -0,0 +1,21 @@
+import time
+from src.core import utility_time
+from src.core.utility_time import now_hms
+
+def test_now_hms_matches_strftime(monkeypatch):
+    monkeypatch.setattr(utility_time.time, 'time', lambda: 1700000000.5)
+    assert now_hms() == time.strftime('%H:%M:%S', time.localtime(1700000000))
+
+def test_now_hms_reformats_only_on_new_second(monkeypatch):
+    now = [1700000000.1]
+    calls = []
+    monkeypatch.setattr(utility_time, '_cached_hms', (-1, ''))
+    real_localtime = time.localtime
+    monkeypatch.setattr(utility_time.time, 'time', lambda: now[0])
+    monkeypatch.setattr(utility_time.time, 'localtime', lambda s: calls.append(s) or real_localtime(s))
+    first = now_hms()
+    now[0] = 1700000000.9
+    assert now_hms() == first
+    now[0] = 1700000001.0
+    assert now_hms() == time.strftime('%H:%M:%S', real_localtime(1700000001))
+    assert calls == [1700000000, 1700000001]